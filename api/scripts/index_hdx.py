@@ -63,6 +63,9 @@ def index_parent_of_compact_cells(
 
 def create_h3_indices(file: s3fs.core.S3File, dataset_id: int) -> List[H3Data]:
     indices = pd.read_parquet(file)["h3_index"]
+    if pd.api.types.is_integer_dtype(indices):
+        # worldex writes cells as sorted uint64
+        indices = indices.map(h3.h3_to_string)
     compacted_indices = list(h3.compact(indices))
     df_pop = pd.DataFrame({"h3_index": compacted_indices}).astype({"h3_index": str})
     return [
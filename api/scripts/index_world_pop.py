@@ -59,6 +59,9 @@ def index_parent_of_compact_cells(
 
 def create_h3_indices(file: s3fs.core.S3File, dataset_id: int) -> List[H3Data]:
     indices = pd.read_parquet(file)["h3_index"]
+    if pd.api.types.is_integer_dtype(indices):
+        # worldex writes cells as sorted uint64
+        indices = indices.map(h3.h3_to_string)
     # indices = h3.compact(indices)
     indices = list(indices)
     df_pop = pd.DataFrame({"h3_index": indices}).astype({"h3_index": str})
@@ -0,0 +1,46 @@
+"""Benchmark compacting a full polyfill against a hierarchical cover.
+
+Buffers a point into a disc `radius` degrees wide and times polyfilling it at
+`resolution` followed by `compact`, against `hierarchical_cover`, both with
+centroid containment. Both paths must produce the same cells.
+
+Usage:
+
+    poetry run python benchmarks/adaptive_cover.py [radius] [resolution]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import shapely
+from h3ronpy.arrow import compact
+from shapely.geometry import Point
+
+from worldex.utils.cover import hierarchical_cover, polyfill
+
+
+def main(radius: float = 8, resolution: int = 8) -> None:
+    geom = shapely.segmentize(Point(5, 45).buffer(radius), 0.1)
+
+    start = time.perf_counter()
+    cells = polyfill([geom], resolution, "centroid")
+    full = compact(pa.array(cells, type=pa.uint64())).to_numpy(zero_copy_only=False)
+    full_seconds = time.perf_counter() - start
+    print(f"{len(cells)} cells, {len(full)} compacted")
+
+    start = time.perf_counter()
+    cover = hierarchical_cover([geom], resolution, "centroid")
+    cover_seconds = time.perf_counter() - start
+
+    same = np.array_equal(np.sort(full), np.sort(cover))
+    print("polyfill+compact(s)  cover(s)  speedup  same")
+    print(
+        f"{full_seconds:>19.2f}  {cover_seconds:>8.2f}  "
+        f"{full_seconds / cover_seconds:>7.1f}  {same}"
+    )
+
+
+if __name__ == "__main__":
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 8, *map(int, sys.argv[2:]))
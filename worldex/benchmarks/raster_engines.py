@@ -0,0 +1,74 @@
+"""Benchmark the pixel and polygonize raster engines.
+
+Times both engines over masks of increasing fragmentation, which is what
+`POLYGONIZE_MAX_EDGES_PER_CELL` in `worldex.handlers.raster_handlers` is
+calibrated against. Run it at a few resolutions, the crossover moves with
+the number of pixels per cell.
+
+Usage:
+
+    poetry run python benchmarks/raster_engines.py [size] [resolution]
+"""
+
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from worldex.handlers.raster_handlers import RasterHandler, fragmentation
+
+
+def write_mask(path: Path, size: int, blobs: int, seed: int = 0) -> Path:
+    """Raster with `blobs` random rectangular patches of data on a nodata background"""
+    rng = np.random.default_rng(seed)
+    data = np.zeros((size, size), dtype="uint8")
+    side = max(1, int(size * 0.8 / np.sqrt(blobs)))
+    for row, col in rng.integers(0, size - side, (blobs, 2)):
+        data[row : row + side, col : col + side] = 1
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        height=size,
+        width=size,
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=from_origin(0, 0, 0.001, 0.001),
+        nodata=0,
+        tiled=True,
+    ) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def timed(handler: RasterHandler):
+    start = time.perf_counter()
+    cells = handler.h3index(stream=True, as_="uint64")
+    return cells, time.perf_counter() - start
+
+
+def main(size: int = 4096, resolution: int = 8) -> None:
+    with TemporaryDirectory() as tmp:
+        print("blobs  fragmentation  pixels(s)  polygonize(s)  auto(s)  same")
+        for blobs in [1, 16, 256, 4096, 65536]:
+            path = write_mask(Path(tmp) / f"mask-{blobs}.tif", size, blobs)
+            with rasterio.open(path) as src:
+                frag = fragmentation(src.read(1) > 0)
+            results = {
+                engine: timed(RasterHandler.from_file(path, resolution, engine=engine))
+                for engine in ["pixels", "polygonize", "auto"]
+            }
+            same = set(results["pixels"][0]) == set(results["polygonize"][0])
+            print(
+                f"{blobs:5d}  {frag:13.4f}  {results['pixels'][1]:9.3f}"
+                f"  {results['polygonize'][1]:13.3f}  {results['auto'][1]:7.3f}  {same}"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,91 @@
+"""Benchmark windowed raster indexing.
+
+Compares the legacy float window tiling (np.linspace over the bounds) with the
+block aligned window planner on the 128x128 test fixture and a large synthetic
+raster.
+
+Usage:
+
+    poetry run python benchmarks/raster_windows.py [size]
+"""
+
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from worldex.handlers.raster_handlers import RasterHandler
+from worldex.utils.cells import CellAccumulator
+
+
+def write_raster(path: Path, size: int, tiled: bool) -> Path:
+    data = np.random.rand(size, size).astype("float32")
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        height=size,
+        width=size,
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=from_origin(0, 0, 0.0001, 0.0001),
+        tiled=tiled,
+        compress="deflate",
+    ) as dst:
+        dst.write(data, 1)
+    return path
+
+
+def legacy_windows(handler: RasterHandler, window=(10, 10)) -> np.ndarray:
+    """Window tiling used before the planner, kept here for comparison"""
+    [left, bottom, right, top] = handler.src.bounds
+    x_range, x_step = np.linspace(left, right, window[0], retstep=True)
+    y_range, y_step = np.linspace(bottom, top, window[1], retstep=True)
+    cells = CellAccumulator()
+    for x in x_range:
+        for y in y_range:
+            rio_window = handler.src.window(x, y, x + x_step, y + y_step)
+            cells.add(handler.window_to_cells(rio_window))
+    return cells.to_numpy()
+
+
+def planned_windows(handler: RasterHandler, window=(10, 10)) -> np.ndarray:
+    cells = CellAccumulator()
+    for rio_window in handler.plan_windows(window):
+        cells.add(handler.window_to_cells(rio_window))
+    return cells.to_numpy()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(size: int = 8192) -> None:
+    with TemporaryDirectory() as tmp:
+        rasters = {
+            "fixture 128x128": write_raster(Path(tmp) / "fixture.tif", 128, False),
+            f"synthetic {size}x{size}": write_raster(
+                Path(tmp) / "large.tif", size, True
+            ),
+        }
+        for name, path in rasters.items():
+            handler = RasterHandler.from_file(path, 9)
+            full = handler.h3index()
+            legacy, legacy_seconds = timed(legacy_windows, handler)
+            planned, planned_seconds = timed(planned_windows, handler)
+            print(name)
+            print(f"  legacy  {legacy_seconds:8.3f}s  cells={len(legacy)}")
+            print(f"  planned {planned_seconds:8.3f}s  cells={len(planned)}")
+            print(f"  full read cells={len(full)}")
+            print(f"  speedup {legacy_seconds / planned_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
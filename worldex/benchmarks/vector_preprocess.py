@@ -0,0 +1,82 @@
+"""Benchmark per-row geometry preprocessing against `geometries_to_cells`.
+
+Repeats the geometries of the `test_multilinestring` and `test_gpkg` fixtures,
+plus 3D copies of them, `scale` times and times the former per-row path,
+dropping z and buffering lines one geometry at a time before polyfilling,
+against `geometries_to_cells`. Both paths must produce the same cells.
+
+Usage:
+
+    poetry run python benchmarks/vector_preprocess.py [scale] [resolution]
+"""
+
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import LineString, MultiLineString, MultiPolygon, Point, Polygon
+
+from worldex.handlers.vector_handlers import geometries_to_cells
+from worldex.utils.cells import polyfill_wkb
+
+# lines used to be polyfilled as buffers this thin
+BUFFER_SIZE = 0.0000000001
+
+
+def process_geometry(geom):
+    if geom.has_z:
+        geom = shapely.force_2d(geom)
+    if geom.geom_type in ["MultiLineString", "LineString"]:
+        return geom.buffer(BUFFER_SIZE)
+    return geom
+
+
+def fixture_geometries() -> list:
+    line1 = LineString([[0, 0], [0, 0.01], [0.01, 0.01]])
+    line2 = LineString([[-0.01, -0.01], [-0.05, -0.05], [-0.05, 0.01]])
+    line3 = LineString([[0.05, 0.05], [0.05, 0.01]])
+    polygon = Polygon([[0, 0], [0, 0.01], [0.01, 0.01]])
+    polygon2 = Polygon([[0.02, 0.02], [0.01, 0.01], [0.01, 0.02]])
+    geoms = [
+        line1,
+        MultiLineString([line1, line2, line3]),
+        LineString([[-0.01, -0.01], [0.01, 0], [0.02, 0.02]]),
+        Point([-0.02, -0.02]),
+        polygon,
+        MultiPolygon([polygon, polygon2]),
+    ]
+    return geoms + list(shapely.force_3d(geoms, z=1.0))
+
+
+def cells(wkb, resolution: int) -> np.ndarray:
+    return np.sort(
+        polyfill_wkb(np.asarray(wkb), resolution, "intersects")
+        .unique()
+        .to_numpy(zero_copy_only=False)
+    )
+
+
+def main(scale: int = 10_000, resolution: int = 8) -> None:
+    geoms = gpd.GeoSeries(fixture_geometries() * scale, crs=4326)
+    print(f"{len(geoms)} geometries")
+
+    start = time.perf_counter()
+    per_row = cells(geoms.apply(process_geometry).to_wkb(), resolution)
+    per_row_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = geometries_to_cells(geoms.to_numpy(), resolution)
+    vectorized_seconds = time.perf_counter() - start
+
+    same = np.array_equal(per_row, vectorized)
+    print("per row(s)  vectorized(s)  speedup  same")
+    print(
+        f"{per_row_seconds:>9.2f}  {vectorized_seconds:>13.2f}  "
+        f"{per_row_seconds / vectorized_seconds:>7.1f}  {same}"
+    )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
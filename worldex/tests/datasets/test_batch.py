@@ -0,0 +1,76 @@
+import time
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from worldex.datasets.batch import BatchRunner
+from worldex.datasets.dataset import BaseDataset
+
+FILE_SIZE = 1000
+
+
+class FakeDataset(BaseDataset):
+    """Writes one file per download and indexes it into a single cell"""
+
+    source_org: str = "Test"
+
+    def download(self):
+        path = self.dir / "data.bin"
+        if not path.exists():
+            if self.name == "broken":
+                raise ConnectionError(self.name)
+            time.sleep(0.02)
+            path.write_bytes(b"0" * FILE_SIZE)
+
+    def index(self, cell=0x88754A9325FFFFF):
+        self.download()
+        time.sleep(0.02)
+        return pd.DataFrame({"h3_index": [cell]})
+
+
+def fake_datasets(tmp_path, names):
+    return [
+        FakeDataset(
+            name=name,
+            last_fetched=datetime(2024, 1, 1),
+            files=["http://localhost/data.bin"],
+            description="",
+            keywords=[],
+        ).set_dir(tmp_path / name)
+        for name in names
+    ]
+
+
+def test_batch_runner(tmp_path):
+    datasets = fake_datasets(tmp_path, [f"dataset-{i}" for i in range(8)] + ["broken"])
+    runner = BatchRunner(download_workers=3, index_workers=2)
+    results = {result.dataset.name: result for result in runner.run(datasets)}
+    assert set(results) == {dataset.name for dataset in datasets}
+    assert isinstance(results["broken"].error, ConnectionError)
+    assert results["broken"].index is None
+    for name, result in results.items():
+        if name != "broken":
+            assert result.error is None
+            assert list(result.index.h3_index) == [0x88754A9325FFFFF]
+
+    stats = runner.stats
+    assert stats["download"]["items"] == 9
+    assert stats["extract"]["items"] == 8
+    assert stats["index"]["items"] == 8
+    for stage in ("download", "extract", "index"):
+        assert 0 < stats[stage]["utilization"] <= 1
+
+
+@pytest.mark.parametrize("max_bytes", [FILE_SIZE, 3 * FILE_SIZE])
+def test_batch_runner_disk_budget(tmp_path, max_bytes):
+    datasets = fake_datasets(tmp_path, [f"dataset-{i}" for i in range(6)])
+    runner = BatchRunner(download_workers=4, max_bytes=max_bytes, cleanup=True)
+    in_flight = [
+        sum((tmp_path / d.name / "data.bin").exists() for d in datasets)
+        for _ in runner.run(datasets)
+    ]
+    # a dataset is only admitted while the budget is not used up
+    assert max(in_flight) <= max_bytes // FILE_SIZE
+    assert runner.stats["disk"]["peak"] <= max_bytes
+    assert not any((tmp_path / d.name / "data.bin").exists() for d in datasets)
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import geopandas as gpd
+import h3
+import pandas as pd
+from shapely.geometry import Polygon
+
+from worldex.datasets.dataset import BaseDataset
+from worldex.handlers.vector_handlers import VectorHandler
+from worldex.utils.archive import EXTRACTED
+from worldex.utils.cells import format_cells
+
+
+def test_write_adaptive_cells(tmp_path):
+    gdf = gpd.GeoDataFrame(
+        geometry=[Polygon([[0, 0], [0.3, 0.1], [0.1, 0.4]])], crs=4326
+    )
+    handler = VectorHandler(gdf)
+    cells = handler.h3index(adaptive=True, as_="uint64")
+    dataset = BaseDataset(
+        name="adaptive",
+        source_org="Test",
+        last_fetched=datetime(2024, 1, 1),
+        files=[],
+        description="",
+        keywords=[],
+    ).set_dir(tmp_path / "adaptive")
+    dataset.write(pd.DataFrame({"h3_index": cells}))
+
+    compacted = pd.read_parquet(tmp_path / "adaptive" / "h3-compact.parquet")
+    assert set(format_cells(compacted.h3_index)) == h3.compact(handler.h3index())
+    multires = pd.read_parquet(tmp_path / "adaptive" / "h3-multires.parquet")
+    assert set(multires.h3_index[~multires.children_indicator]) == set(
+        compacted.h3_index
+    )
+
+
+def test_find_files_relative_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dataset = BaseDataset(
+        name="archives",
+        source_org="Test",
+        last_fetched=datetime(2024, 1, 1),
+        files=[],
+        description="",
+        keywords=[],
+    ).set_dir("archives")
+    # a 7z archive extracted on an earlier run
+    (tmp_path / "archives" / "roads.7z").touch()
+    extracted = tmp_path / "archives" / "roads"
+    extracted.mkdir()
+    (extracted / EXTRACTED).touch()
+    (extracted / "roads.shp").touch()
+    (tmp_path / "archives" / "rivers.shp").touch()
+
+    assert dataset.find_files("*.shp") == [
+        str(tmp_path / "archives" / "rivers.shp"),
+        str(extracted / "roads.shp"),
+    ]
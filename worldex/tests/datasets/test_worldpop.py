@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.transform import from_origin
+
+from worldex.datasets.worldpop import WorldPopDataset
+from worldex.handlers.raster_handlers import RasterHandler
+
+
+def write_raster(path, data):
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        height=data.shape[0],
+        width=data.shape[1],
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=from_origin(0, 0, 0.001, 0.001),
+        nodata=-1,
+    ) as dst:
+        dst.write(data, 1)
+
+
+def test_worldpop_agg_across_rasters(tmp_path):
+    dataset = WorldPopDataset(
+        name="stack",
+        last_fetched=datetime(2024, 1, 1),
+        files=[],
+        description="",
+        keywords=[],
+    ).set_dir(tmp_path / "stack")
+    rng = np.random.default_rng(0)
+    # an age and sex stack, the same grid with different values
+    files = [dataset.dir / "f_0.tif", dataset.dir / "m_0.tif"]
+    for file in files:
+        data = rng.random((64, 64)).astype("float32")
+        data[:8] = -1
+        write_raster(file, data)
+
+    agg = ["sum", "mean", "max", "count"]
+    result = dataset.index(agg=agg).set_index("h3_index").sort_index()
+
+    partials = pd.concat(
+        RasterHandler.from_file(file).h3index(as_="uint64", agg=agg) for file in files
+    )
+    expected = partials.groupby("h3_index").agg(
+        {"sum": "sum", "max": "max", "count": "sum"}
+    )
+    expected["mean"] = expected["sum"] / expected["count"]
+    pd.testing.assert_frame_equal(result[agg], expected[agg], check_names=False)
+    assert (result["count"] > 0).any()
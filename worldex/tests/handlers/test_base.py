@@ -0,0 +1,19 @@
+import math
+
+from worldex.handlers.base import TASKS_PER_WORKER, map_unordered
+
+
+def test_map_unordered_bounded():
+    pulled = []
+
+    def items():
+        for i in range(50):
+            pulled.append(i)
+            yield i
+
+    results = map_unordered(math.sqrt, items(), 2)
+    first = next(results)
+    # the remaining items are only submitted as results are consumed
+    assert len(pulled) <= 2 * TASKS_PER_WORKER + 1
+    assert sorted([first, *results]) == [math.sqrt(i) for i in range(50)]
+    assert list(map_unordered(math.sqrt, [4, 9])) == [2.0, 3.0]
@@ -1,4 +1,10 @@
-from worldex.handlers.vector_handlers import VectorHandler
+import geopandas as gpd
+import h3
+import numpy as np
+import pandas as pd
+import pytest
+
+from worldex.handlers.vector_handlers import CsvHandler, PointHandler, VectorHandler
 
 
 def test_csv_lat_lng(tmp_path):
@@ -10,7 +16,26 @@ def test_csv_lat_lng(tmp_path):
     with open(csv_path, "w") as f:
         f.write(csv_string)
     handler = VectorHandler.from_file(csv_path)
+    assert isinstance(handler, CsvHandler)
     assert set(handler.h3index()) == {"88754e2b3dfffff", "88754e6499fffff"}
+    # rows are streamed on a single process whatever the workers
+    assert set(handler.h3index(workers=2)) == {"88754e2b3dfffff", "88754e6499fffff"}
+
+
+def test_csv_points(tmp_path):
+    rng = np.random.default_rng(0)
+    lngs = rng.uniform(-180, 180, 1000)
+    lats = rng.uniform(-85, 85, 1000)
+    csv_path = tmp_path / "test.csv"
+    with open(csv_path, "w") as f:
+        f.write("name,Longitude,Latitude\n")
+        for i, (lng, lat) in enumerate(zip(lngs, lats)):
+            f.write(f"point{i},{lng!r},{lat!r}\n")
+        f.write("missing,,\n")
+    handler = VectorHandler.from_file(csv_path)
+    assert set(handler.h3index()) == {
+        h3.geo_to_h3(lat, lng, 8) for lng, lat in zip(lngs, lats)
+    }
 
 
 def test_csv_wkt(tmp_path):
@@ -35,3 +60,73 @@ def test_csv_wkb(tmp_path):
         f.write(csv_string)
     handler = VectorHandler.from_file(csv_path)
     assert set(handler.h3index()) == {"88754e2b3dfffff", "88754e6499fffff"}
+
+
+def test_csv_batches(tmp_path):
+    lines = [f"LINESTRING ({i / 1000} 0, {i / 1000} 0.01)" for i in range(1000)]
+    csv_path = tmp_path / "test.csv"
+    with open(csv_path, "w") as f:
+        f.write("id,wkt\n")
+        for i, line in enumerate(lines):
+            f.write(f'{i},"{line}"\n')
+    gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries.from_wkt(lines), crs=4326)
+    expected = set(VectorHandler(gdf).h3index())
+    handler = CsvHandler(csv_path, block_size=4096)
+    assert set(handler.h3index()) == expected
+    assert handler.stats["rows"] == 1000
+    assert handler.stats["batches"] > 1
+    assert handler.bbox == (0, 0, 0.999, 0.01)
+
+
+def test_csv_bad_coordinates(tmp_path):
+    csv_string = """lat,lng,name
+0,0,point1
+unknown,0.2,point3
+0.1,0.1,point2
+,,missing
+"""
+    csv_path = tmp_path / "test.csv"
+    with open(csv_path, "w") as f:
+        f.write(csv_string)
+    handler = VectorHandler.from_file(csv_path)
+    assert set(handler.h3index()) == {"88754e2b3dfffff", "88754e6499fffff"}
+    assert handler.stats["rows"] == 4
+
+
+def test_csv_bad_geometries(tmp_path):
+    csv_string = """WKT,name
+Point(0 0),point1
+,empty
+Point(0.1,missing
+Point(0.1 0.1),point2
+"""
+    csv_path = tmp_path / "test.csv"
+    with open(csv_path, "w") as f:
+        f.write(csv_string)
+    handler = VectorHandler.from_file(csv_path)
+    assert set(handler.h3index()) == {"88754e2b3dfffff", "88754e6499fffff"}
+
+
+def test_point_handler():
+    lngs = [0, 0.1, np.nan, 10]
+    lats = [0, 0.1, 0, np.nan]
+    handler = PointHandler(lngs, lats)
+    # rows with a missing coordinate are skipped
+    assert set(handler.h3index()) == {"88754e2b3dfffff", "88754e6499fffff"}
+    assert set(handler.h3index(aoi=(-0.05, -0.05, 0.05, 0.05))) == {
+        h3.geo_to_h3(0, 0, 8)
+    }
+    assert set(PointHandler([0], [0], resolution=5).h3index()) == {
+        h3.geo_to_h3(0, 0, 5)
+    }
+
+
+def test_excel_points(tmp_path):
+    pytest.importorskip("openpyxl")
+    excel_path = tmp_path / "points.xlsx"
+    pd.DataFrame(
+        {"name": ["point1", "point2"], "Latitude": [0, 0.1], "Longitude": [0, 0.1]}
+    ).to_excel(excel_path, index=False)
+    handler = VectorHandler.from_excel(excel_path)
+    assert isinstance(handler, PointHandler)
+    assert set(handler.h3index()) == {"88754e2b3dfffff", "88754e6499fffff"}
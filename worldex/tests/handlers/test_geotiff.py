@@ -1,8 +1,13 @@
+import h3
 import numpy as np
+import pandas as pd
+import pyproj
 import pytest
 import rasterio
 from rasterio.transform import from_origin
+from rasterio.windows import Window
 
+from worldex.handlers import raster_handlers
 from worldex.handlers.raster_handlers import RasterHandler
 
 
@@ -70,3 +75,439 @@ def test_geotiff_file_epsg3857(geotiff_test_file_epsg3857):
         "863830597ffffff",
         "863832967ffffff",
     }
+
+
+@pytest.fixture
+def tiled_geotiff_test_file(tmp_path):
+    data = np.random.rand(512, 512).astype("float32")
+    data[100:300, 50:200] = -1
+    transform = from_origin(0, 0, 0.0001, 0.0001)
+    output_file = tmp_path / "tiled.tif"
+
+    with rasterio.open(
+        output_file,
+        "w",
+        driver="GTiff",
+        height=data.shape[0],
+        width=data.shape[1],
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=transform,
+        nodata=-1,
+        tiled=True,
+        blockxsize=128,
+        blockysize=128,
+    ) as dst:
+        dst.write(data, 1)
+    yield output_file
+
+
+@pytest.fixture
+def masked_geotiff_test_file(tmp_path):
+    data = np.random.rand(128, 128).astype("float32")
+    mask = np.zeros(data.shape, dtype=bool)
+    mask[:64, :64] = True
+    output_file = tmp_path / "masked.tif"
+
+    with rasterio.Env(GDAL_TIFF_INTERNAL_MASK=True):
+        with rasterio.open(
+            output_file,
+            "w",
+            driver="GTiff",
+            height=data.shape[0],
+            width=data.shape[1],
+            count=1,
+            dtype=data.dtype,
+            crs="epsg:4326",
+            transform=from_origin(0, 0, 0.001, 0.001),
+        ) as dst:
+            dst.write(data, 1)
+            dst.write_mask(mask)
+    yield output_file
+
+
+def test_geotiff_internal_mask(masked_geotiff_test_file):
+    handler = RasterHandler.from_file(masked_geotiff_test_file, 8)
+    cells = set(handler.h3index())
+    with rasterio.open(masked_geotiff_test_file) as src:
+        unmasked = src.read_masks(1) > 0
+        transform = src.transform
+    # every cell holds the centre of a pixel the mask leaves valid
+    for cell in cells:
+        lat, lng = h3.h3_to_geo(cell)
+        col, row = ~transform * (lng, lat)
+        assert unmasked[int(row), int(col)]
+    assert cells
+    multiband = RasterHandler.from_file(masked_geotiff_test_file, 8, bands=[1, 1])
+    assert set(multiband.h3index()) == cells
+
+
+def test_geotiff_stream_matches_full_read(tiled_geotiff_test_file):
+    handler = RasterHandler.from_file(tiled_geotiff_test_file, 9)
+    expected = set(handler.h3index())
+    assert set(handler.h3index(stream=True)) == expected
+    assert handler.stats["blocks"] == 16
+    assert set(handler.h3index(block_shape=(200, 200))) == expected
+    assert handler.stats["blocks"] == 4
+
+
+def test_geotiff_checkpoint_resume(tiled_geotiff_test_file, tmp_path, monkeypatch):
+    handler = RasterHandler.from_file(tiled_geotiff_test_file, 9)
+    expected = set(handler.h3index())
+    checkpoint = tmp_path / "checkpoint"
+
+    # crash on the 6th window, after 5 windows were persisted
+    window_to_cells = handler.window_to_cells
+    calls = []
+    crash = True
+
+    def crashing_window_to_cells(rio_window):
+        calls.append(rio_window)
+        if len(calls) == 6 and crash:
+            raise RuntimeError("pre-empted")
+        return window_to_cells(rio_window)
+
+    monkeypatch.setattr(handler, "window_to_cells", crashing_window_to_cells)
+    with pytest.raises(RuntimeError):
+        handler.h3index(stream=True, checkpoint=checkpoint)
+    # the finished windows are written together as one shard
+    assert len(list(checkpoint.glob("shard-*.parquet"))) == 1
+    assert len((checkpoint / "windows.jsonl").read_text().splitlines()) == 1
+
+    calls.clear()
+    crash = False
+    assert set(handler.h3index(stream=True, checkpoint=checkpoint)) == expected
+    assert len(calls) == 16 - 5
+
+    # a checkpoint from other indexing options or windows is not reused
+    other = RasterHandler.from_file(tiled_geotiff_test_file, 8)
+    with pytest.raises(ValueError):
+        other.h3index(stream=True, checkpoint=checkpoint)
+    for kwargs in [{"window": (3, 3)}, {"block_shape": (256, 256)}]:
+        with pytest.raises(ValueError):
+            handler.h3index(checkpoint=checkpoint, **kwargs)
+
+
+def test_geotiff_aoi(tiled_geotiff_test_file):
+    handler = RasterHandler.from_file(tiled_geotiff_test_file, 9)
+    aoi = (0.01, -0.03, 0.025, -0.005)
+    expected = {
+        cell
+        for cell in handler.h3index()
+        if aoi[1] <= h3.h3_to_geo(cell)[0] <= aoi[3]
+        and aoi[0] <= h3.h3_to_geo(cell)[1] <= aoi[2]
+    }
+    assert set(handler.h3index(aoi=aoi)) == expected
+    assert set(handler.h3index(aoi=aoi, stream=True)) == expected
+    assert set(handler.h3index(aoi=aoi, window=(3, 3))) == expected
+    assert handler.aoi_window(aoi).width < 512
+    assert handler.h3index(aoi=(10, 10, 11, 11)) == []
+
+
+def test_geotiff_parallel_windows(tiled_geotiff_test_file, monkeypatch):
+    handler = RasterHandler.from_file(tiled_geotiff_test_file, 9)
+    expected = set(handler.h3index(window=(4, 4)))
+    assert set(handler.h3index(window=(4, 4), workers=2)) == expected
+    assert set(handler.h3index(stream=True, workers=2)) == set(handler.h3index())
+    # the default read is split into block windows too
+    monkeypatch.setattr(raster_handlers, "DEFAULT_BLOCK_SHAPE", (128, 128))
+    assert set(handler.h3index(workers=2)) == expected
+
+
+def test_geotiff_windows_match_full_read(geotiff_test_file, tiled_geotiff_test_file):
+    for file in [geotiff_test_file, tiled_geotiff_test_file]:
+        handler = RasterHandler.from_file(file, 9)
+        expected = set(handler.h3index())
+        assert set(handler.h3index(window=(10, 10))) == expected
+        assert set(handler.h3index(window=(3, 3), overlap=1)) == expected
+
+
+def test_geotiff_plan_windows(tiled_geotiff_test_file):
+    handler = RasterHandler.from_file(tiled_geotiff_test_file)
+    windows = list(handler.plan_windows((3, 3)))
+    # 512 / 3 pixels rounded up to the 128 pixel tiles, padded by three pixels
+    assert [(w.col_off, w.row_off, w.width, w.height) for w in windows] == [
+        (0, 0, 259, 259),
+        (253, 0, 259, 259),
+        (0, 253, 259, 259),
+        (253, 253, 259, 259),
+    ]
+
+
+@pytest.fixture
+def speckled_geotiff_test_file(tmp_path):
+    data = np.random.default_rng(0).random((512, 512)).astype("float32")
+    data[data < 0.5] = -1
+    output_file = tmp_path / "speckled.tif"
+
+    with rasterio.open(
+        output_file,
+        "w",
+        driver="GTiff",
+        height=data.shape[0],
+        width=data.shape[1],
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=from_origin(0, 0, 0.001, 0.001),
+        nodata=-1,
+        tiled=True,
+        blockxsize=64,
+        blockysize=64,
+    ) as dst:
+        dst.write(data, 1)
+    yield output_file
+
+
+def test_geotiff_window_edges(speckled_geotiff_test_file):
+    handler = RasterHandler.from_file(speckled_geotiff_test_file, 9)
+    with rasterio.open(speckled_geotiff_test_file) as src:
+        data = src.read(1)
+        # every cell whose centroid falls on a valid pixel, searched around
+        # the cells of the valid pixel centres
+        rows, cols = np.nonzero(data != src.nodata)
+        lngs, lats = src.transform * (cols + 0.5, rows + 0.5)
+        centres = {h3.geo_to_h3(lat, lng, 9) for lat, lng in zip(lats, lngs)}
+        expected = set()
+        for cell in set().union(*(h3.k_ring(cell, 1) for cell in centres)):
+            row, col = src.index(*h3.h3_to_geo(cell)[::-1])
+            if 0 <= row < src.height and 0 <= col < src.width:
+                if data[row, col] != src.nodata:
+                    expected.add(cell)
+    # a single read and any split into windows find exactly those cells
+    assert set(handler.h3index()) == expected
+    for kwargs in [
+        {"stream": True},
+        {"block_shape": (100, 100)},
+        {"window": (3, 3)},
+        {"window": (5, 2), "overlap": 1},
+    ]:
+        assert set(handler.h3index(**kwargs)) == expected
+
+
+def test_geotiff_uint64(geotiff_test_file):
+    handler = RasterHandler.from_file(geotiff_test_file)
+    expected = set(handler.h3index())
+    for kwargs in [{}, {"stream": True}, {"window": (2, 2)}]:
+        cells = handler.h3index(as_="uint64", **kwargs)
+        assert cells.dtype == "uint64"
+        assert {f"{cell:x}" for cell in cells} == expected
+
+
+@pytest.fixture
+def multiband_geotiff_test_file(tmp_path):
+    data = np.random.rand(2, 256, 256).astype("float32")
+    data[0, :, :128] = -1
+    data[1, :128, :] = -1
+    output_file = tmp_path / "multiband.tif"
+
+    with rasterio.open(
+        output_file,
+        "w",
+        driver="GTiff",
+        height=data.shape[1],
+        width=data.shape[2],
+        count=2,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=from_origin(0, 0, 0.0001, 0.0001),
+        nodata=-1,
+    ) as dst:
+        dst.write(data)
+    yield output_file
+
+
+def test_geotiff_bands(multiband_geotiff_test_file):
+    band1 = set(RasterHandler.from_file(multiband_geotiff_test_file, 9).h3index())
+    band2 = set(
+        RasterHandler.from_file(multiband_geotiff_test_file, 9, bands=[2]).h3index()
+    )
+    assert band1 != band2
+
+    handler = RasterHandler.from_file(multiband_geotiff_test_file, 9, bands=[1, 2])
+    assert set(handler.h3index()) == band1 | band2
+    assert set(handler.h3index(stream=True)) == band1 | band2
+
+    handler = RasterHandler.from_file(
+        multiband_geotiff_test_file, 9, bands=[1, 2], band_mask="all"
+    )
+    assert set(handler.h3index(window=(2, 2))) == band1 & band2
+
+
+@pytest.fixture
+def sparse_geotiff_test_file(tmp_path):
+    data = np.full((1024, 1024), -1, dtype="float32")
+    rng = np.random.default_rng(0)
+    data[rng.integers(0, 1024, 200), rng.integers(0, 1024, 200)] = 1
+    data[:300, :300] = 1
+    output_file = tmp_path / "sparse.tif"
+
+    with rasterio.open(
+        output_file,
+        "w",
+        driver="GTiff",
+        height=data.shape[0],
+        width=data.shape[1],
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=from_origin(0, 0, 0.001, 0.001),
+        nodata=-1,
+    ) as dst:
+        dst.write(data, 1)
+    yield output_file
+
+
+def test_geotiff_overviews(sparse_geotiff_test_file):
+    handler = RasterHandler.from_file(sparse_geotiff_test_file, 5)
+    full = set(handler.h3index())
+    decimated = set(handler.h3index(overviews=True))
+    assert handler.stats == {"overview": 1, "decimation": handler.decimation()}
+    assert handler.decimation() > 1
+    assert decimated > full
+
+    with rasterio.open(sparse_geotiff_test_file, "r+") as dst:
+        dst.build_overviews([2, 4, 8], rasterio.enums.Resampling.average)
+    handler = RasterHandler.from_file(sparse_geotiff_test_file, 5)
+    assert set(handler.h3index(overviews=True)) >= full
+    assert handler.stats["overview"] == 8
+
+    for kwargs in [
+        {"stream": True},
+        {"block_shape": (128, 128)},
+        {"window": Window(0, 0, 64, 64)},
+        {"overlap": 1},
+        {"workers": 2},
+        {"checkpoint": sparse_geotiff_test_file.parent / "checkpoint"},
+    ]:
+        with pytest.raises(ValueError):
+            handler.h3index(overviews=True, **kwargs)
+
+
+def test_geotiff_polygonize_engine(tiled_geotiff_test_file, masked_geotiff_test_file):
+    for file in [tiled_geotiff_test_file, masked_geotiff_test_file]:
+        expected = set(RasterHandler.from_file(file, 9).h3index())
+        for engine in ["polygonize", "auto"]:
+            handler = RasterHandler.from_file(file, 9, engine=engine)
+            assert set(handler.h3index()) == expected
+            assert set(handler.h3index(stream=True)) >= expected
+
+    handler = RasterHandler.from_file(
+        tiled_geotiff_test_file, 9, engine="polygonize", simplify=True
+    )
+    assert len(handler.h3index()) > 0
+
+
+def test_geotiff_adaptive(tiled_geotiff_test_file):
+    handler = RasterHandler.from_file(tiled_geotiff_test_file, 9)
+    expected = set(h3.compact(handler.h3index()))
+    assert set(handler.h3index(adaptive=True)) == expected
+
+    aoi = (0.01, -0.03, 0.025, -0.005)
+    expected = set(h3.compact(handler.h3index(aoi=aoi)))
+    assert set(handler.h3index(aoi=aoi, adaptive=True)) == expected
+    with pytest.raises(ValueError):
+        handler.h3index(adaptive=True, stream=True)
+
+
+def test_geotiff_agg(tiled_geotiff_test_file, tmp_path):
+    with rasterio.open(tiled_geotiff_test_file) as src:
+        data = src.read(1)
+        transform = src.transform
+    # group valid pixels by the cell holding their centre
+    rows, cols = np.nonzero(data != -1)
+    lngs, lats = transform * (cols + 0.5, rows + 0.5)
+    expected = (
+        pd.DataFrame(
+            {
+                "h3_index": [h3.geo_to_h3(lat, lng, 9) for lat, lng in zip(lats, lngs)],
+                "value": data[rows, cols].astype(np.float64),
+            }
+        )
+        .groupby("h3_index")
+        .value.agg(["sum", "mean", "max", "count"])
+    )
+
+    handler = RasterHandler.from_file(tiled_geotiff_test_file, 9)
+    result = handler.h3index(agg=["sum", "mean", "max", "count"])
+    assert set(result.h3_index) >= set(handler.h3index())
+    with_values = result[result["count"] > 0].set_index("h3_index").sort_index()
+    pd.testing.assert_frame_equal(with_values, expected, check_names=False)
+    assert result[result["count"] == 0]["mean"].isna().all()
+    # cells without values are only those holding no pixel centre
+    assert set(result[result["count"] == 0].h3_index) <= set(handler.h3index())
+
+    for kwargs in [dict(stream=True), dict(window=(3, 3))]:
+        other = handler.h3index(
+            agg=["sum", "count"], checkpoint=tmp_path / str(kwargs), **kwargs
+        )
+        other = other.set_index("h3_index").sort_index()
+        pd.testing.assert_frame_equal(
+            other, result.set_index("h3_index").sort_index()[["sum", "count"]]
+        )
+
+    with pytest.raises(ValueError):
+        handler.h3index(agg=["median"])
+    # resuming the window=(3, 3) run with stream would count pixels twice
+    with pytest.raises(ValueError):
+        handler.h3index(
+            agg=["sum", "count"],
+            stream=True,
+            checkpoint=tmp_path / str(dict(window=(3, 3))),
+        )
+
+
+@pytest.fixture
+def utm_geotiff_test_file(tmp_path):
+    data = np.random.rand(64, 64).astype("float32")
+    data[:20, :20] = -1
+    output_file = tmp_path / "utm.tif"
+
+    with rasterio.open(
+        output_file,
+        "w",
+        driver="GTiff",
+        height=data.shape[0],
+        width=data.shape[1],
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:32631",
+        transform=from_origin(500000, 1000000, 100, 100),
+        nodata=-1,
+    ) as dst:
+        dst.write(data, 1)
+    yield output_file, data
+
+
+def test_geotiff_reproject_centroids(utm_geotiff_test_file):
+    file, data = utm_geotiff_test_file
+    # cells around the raster whose centroid falls on a valid pixel
+    transformer = pyproj.Transformer.from_crs("epsg:32631", "epsg:4326", always_xy=True)
+    west, south, east, north = transformer.transform_bounds(
+        500000, 1000000 - 6400, 506400, 1000000
+    )
+    area = {
+        "type": "Polygon",
+        "coordinates": [
+            [
+                [south - 0.01, west - 0.01],
+                [south - 0.01, east + 0.01],
+                [north + 0.01, east + 0.01],
+                [north + 0.01, west - 0.01],
+                [south - 0.01, west - 0.01],
+            ]
+        ],
+    }
+    expected = set()
+    for cell in h3.polyfill(area, 8):
+        lat, lng = h3.h3_to_geo(cell)
+        x, y = transformer.transform(lng, lat, direction="INVERSE")
+        row, col = int((1000000 - y) // 100), int((x - 500000) // 100)
+        if 0 <= row < 64 and 0 <= col < 64 and data[row, col] != -1:
+            expected.add(cell)
+
+    handler = RasterHandler.from_file(file, 8, reproject="centroids")
+    assert set(handler.h3index()) == expected
+    assert set(handler.h3index(stream=True)) == expected
+    assert handler.bbox[0] == pytest.approx(3, abs=0.01)
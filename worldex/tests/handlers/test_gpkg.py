@@ -1,8 +1,13 @@
+import zipfile
+
 import geopandas as gpd
+import h3
 import pytest
-from shapely.geometry import LineString, MultiPolygon, Point, Polygon
+import shapely
+from shapely.geometry import LineString, MultiPolygon, Point, Polygon, box
 
-from worldex.handlers.vector_handlers import VectorHandler
+from worldex.handlers.vector_handlers import VectorHandler, WkbHandler
+from worldex.utils.cells import format_cells, multiresolution_cells
 
 
 @pytest.fixture
@@ -43,3 +48,110 @@ def test_gpkg_handler(gpkg_test_file):
 def test_gpkg_handler_diff_resolution(gpkg_test_file):
     handler = VectorHandler.from_file(gpkg_test_file, resolution=4)
     assert set(handler.h3index()) == {"84754e7ffffffff", "84754a9ffffffff"}
+
+
+def test_gpkg_handler_chunks(gpkg_test_file):
+    handler = VectorHandler.from_file(gpkg_test_file)
+    assert isinstance(handler, WkbHandler)
+    expected = set(handler.h3index())
+    assert set(handler.h3index(chunk_size=1)) == expected
+    assert set(handler.h3index(chunk_size=3, workers=2)) == expected
+    aoi = box(-0.005, -0.005, 0.015, 0.015)
+    assert set(handler.h3index(aoi=aoi, workers=2)) == set(handler.h3index(aoi=aoi))
+    with pytest.raises(TypeError):
+        handler.h3index(chunksize=1)
+
+
+def test_gpkg_handler_reads_wkb(gpkg_test_file):
+    handler = VectorHandler.from_file(gpkg_test_file)
+    assert isinstance(handler, WkbHandler)
+    assert handler.bbox == pytest.approx((-0.02, -0.02, 0.02, 0.02))
+
+
+def test_ogr_without_geometry(tmp_path):
+    csv_path = tmp_path / "T.CSV"
+    csv_path.write_text("lon,lat\n0,0\n")
+    with zipfile.ZipFile(tmp_path / "c.zip", "w") as archive:
+        archive.write(csv_path, "pts.csv")
+    # layers without a geometry column are left to geopandas
+    assert WkbHandler.from_ogr(csv_path) is None
+    assert WkbHandler.from_ogr(f"/vsizip/{tmp_path / 'c.zip'}/pts.csv") is None
+
+
+def test_geoparquet_handler(gpkg_test_file, tmp_path):
+    gdf = gpd.read_file(gpkg_test_file)
+    expected = set(VectorHandler(gdf).h3index())
+
+    parquet_path = tmp_path / "test.parquet"
+    gdf.to_parquet(parquet_path)
+    handler = VectorHandler.from_file(parquet_path)
+    assert isinstance(handler, WkbHandler)
+    assert set(handler.h3index()) == expected
+
+    # other projections are reprojected by geopandas
+    gdf.to_crs(3857).to_parquet(parquet_path)
+    handler = VectorHandler.from_file(parquet_path)
+    assert isinstance(handler, VectorHandler)
+    assert set(handler.h3index()) == expected
+
+
+def test_gpkg_handler_aoi(gpkg_test_file):
+    aoi = box(-0.005, -0.005, 0.015, 0.015)
+    gdf = gpd.read_file(gpkg_test_file)
+    expected = set(VectorHandler(gdf.clip(aoi)).h3index())
+    assert set(VectorHandler(gdf).h3index(aoi=aoi)) == expected
+    assert set(VectorHandler(gdf).h3index(aoi=aoi.bounds, workers=2)) == expected
+    assert set(VectorHandler.from_file(gpkg_test_file).h3index(aoi=aoi)) == expected
+
+
+def test_gpkg_handler_reprojects_in_chunks(gpkg_test_file):
+    gdf = gpd.read_file(gpkg_test_file)
+    handler = VectorHandler(gdf)
+    assert handler.gdf is gdf
+    expected = set(handler.h3index())
+    aoi = box(-0.005, -0.005, 0.015, 0.015)
+    expected_aoi = set(handler.h3index(aoi=aoi))
+
+    projected = gdf.to_crs(3857)
+    handler = VectorHandler(projected)
+    assert handler.gdf is projected
+    assert set(handler.h3index()) == expected
+    assert set(handler.h3index(chunk_size=1)) == expected
+    assert set(handler.h3index(aoi=aoi)) == expected_aoi
+    assert handler.bbox == pytest.approx(gdf.total_bounds)
+
+
+def test_gpkg_multiresolution_cells(gpkg_test_file):
+    cells = VectorHandler.from_file(gpkg_test_file).h3index(as_="uint64")
+    frame = multiresolution_cells(cells)
+    assert frame.h3_index.is_monotonic_increasing
+
+    compacted = h3.compact(format_cells(cells))
+    assert set(format_cells(frame.h3_index[~frame.children_indicator])) == compacted
+    for resolution in range(8):
+        rows = frame[frame.children_indicator & (frame.resolution == resolution)]
+        assert set(format_cells(rows.h3_index)) == {
+            h3.h3_to_parent(cell, resolution)
+            for cell in compacted
+            if h3.h3_get_resolution(cell) > resolution
+        }
+
+
+def test_gpkg_handler_adaptive(gpkg_test_file):
+    gdf = gpd.read_file(gpkg_test_file)
+    large = Polygon([[0, 0], [0.3, 0.1], [0.1, 0.4]])
+    gdf = gpd.GeoDataFrame(geometry=[*gdf.geometry, large], crs=4326)
+    handler = VectorHandler(gdf)
+    expected = set(handler.h3index())
+
+    cells = handler.h3index(adaptive=True)
+    assert len(cells) < len(expected)
+    assert set(handler.h3index(adaptive=True, chunk_size=1)) == set(cells)
+    uncompacted = set(h3.uncompact(cells, 8))
+    assert set(h3.compact(uncompacted)) == set(cells)
+    # along long edges h3ronpy misses a few cells that do intersect
+    assert uncompacted >= expected
+    union = shapely.union_all(gdf.geometry.values)
+    for cell in uncompacted - expected:
+        boundary = h3.h3_to_geo_boundary(cell, geo_json=True)
+        assert union.intersects(Polygon(boundary))
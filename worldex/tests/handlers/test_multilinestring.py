@@ -4,9 +4,15 @@ These tests ensure that we capture the results properly.
 """
 
 import geopandas as gpd
+import numpy as np
+import shapely
 from shapely.geometry import LineString, MultiLineString
 
-from worldex.handlers.vector_handlers import VectorHandler
+from worldex.handlers.vector_handlers import VectorHandler, lines_to_cells
+from worldex.utils.cells import polyfill_wkb
+
+# lines used to be polyfilled as buffers this thin
+BUFFER_SIZE = 0.0000000001
 
 
 def test_linestring():
@@ -63,3 +69,20 @@ def test_multilinestring():
         "88754e66d9fffff",
         "88754e66dbfffff",
     }
+
+
+def test_lines_to_cells_match_buffer():
+    rng = np.random.default_rng(0)
+    lines = np.array(
+        [
+            LineString(np.cumsum(rng.normal(0, 0.005, (10, 2)), axis=0) + start)
+            for start in rng.uniform(0, 0.5, (200, 2))
+        ]
+    )
+    buffered = polyfill_wkb(
+        shapely.to_wkb(shapely.buffer(lines, BUFFER_SIZE, quad_segs=16)),
+        8,
+        "intersects",
+    )
+    expected = set(buffered.unique().to_pylist())
+    assert set(lines_to_cells(lines, 8).tolist()) == expected
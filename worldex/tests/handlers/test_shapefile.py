@@ -34,3 +34,11 @@ def test_shp_handler(shp_test_file):
 def test_shp_handler_diff_resolution(shp_test_file):
     handler = VectorHandler.from_file(shp_test_file, resolution=4)
     assert set(handler.h3index()) == {"84754e7ffffffff", "84754a9ffffffff"}
+
+
+def test_shp_handler_uint64(shp_test_file):
+    handler = VectorHandler.from_file(shp_test_file, resolution=4)
+    cells = handler.h3index(as_="uint64")
+    assert cells.dtype == "uint64"
+    assert set(cells) == {0x84754E7FFFFFFFF, 0x84754A9FFFFFFFF}
+    assert handler.h3index(as_="arrow").type == "uint64"
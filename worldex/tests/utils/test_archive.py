@@ -0,0 +1,78 @@
+import zipfile
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Polygon
+
+from worldex.handlers.raster_handlers import RasterHandler
+from worldex.handlers.vector_handlers import VectorHandler
+from worldex.utils.archive import Archive, local_path
+
+
+@pytest.fixture
+def zipped_files(tmp_path):
+    data = np.random.rand(128, 128)
+    tif = tmp_path / "population.tif"
+    with rasterio.open(
+        tif,
+        "w",
+        driver="GTiff",
+        height=data.shape[0],
+        width=data.shape[1],
+        count=1,
+        dtype=data.dtype,
+        crs="epsg:4326",
+        transform=from_origin(0, 0, 0.0001, 0.0001),
+    ) as dst:
+        dst.write(data, 1)
+    gpkg = tmp_path / "areas.gpkg"
+    gdf = gpd.GeoDataFrame(
+        geometry=[Polygon([[0, 0], [0, 0.01], [0.01, 0.01]])], crs=4326
+    )
+    gdf.to_file(gpkg, driver="GPKG")
+
+    inner = tmp_path / "areas_gpkg.zip"
+    with zipfile.ZipFile(inner, "w") as zf:
+        zf.write(gpkg, "areas/areas.gpkg")
+    outer = tmp_path / "data" / "bundle.zip"
+    outer.parent.mkdir()
+    with zipfile.ZipFile(outer, "w") as zf:
+        zf.write(tif, "rasters/POPULATION.TIF")
+        zf.write(inner, "areas_gpkg.zip")
+        zf.writestr("__MACOSX/rasters/._POPULATION.TIF", b"")
+    yield outer, tif, gpkg
+
+
+def test_archive_members_in_place(zipped_files):
+    outer, tif, gpkg = zipped_files
+    archive = Archive(outer)
+    [tif_path] = archive.find("*.tif")
+    assert tif_path == f"/vsizip/{outer}/rasters/POPULATION.TIF"
+    assert local_path(tif_path) == str(outer)
+    assert set(RasterHandler.from_file(tif_path).h3index()) == set(
+        RasterHandler.from_file(tif).h3index()
+    )
+
+    [inner_path] = archive.find("*.zip")
+    assert local_path(inner_path) == str(outer)
+    nested = Archive(inner_path)
+    assert nested.streamable
+    gpkg_path = nested.member_path("areas/areas.gpkg")
+    assert gpkg_path == f"/vsizip/{{/vsizip/{outer}/areas_gpkg.zip}}/areas/areas.gpkg"
+    assert local_path(gpkg_path) == str(outer)
+    assert set(VectorHandler.from_file(gpkg_path).h3index()) == set(
+        VectorHandler.from_file(gpkg).h3index()
+    )
+    # nothing was extracted
+    assert list(outer.parent.iterdir()) == [outer]
+
+
+def test_raster_fingerprint_of_member(zipped_files):
+    outer, _, _ = zipped_files
+    [tif_path] = Archive(outer).find("*.tif")
+    fingerprint = RasterHandler.from_file(tif_path).fingerprint()
+    assert fingerprint["path"] == tif_path
+    assert fingerprint["size"] == outer.stat().st_size
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from rasterio.windows import Window
+
+from worldex.utils.checkpoint import LOG, WindowCheckpoint
+
+
+def windows(n):
+    return [Window(i * 10, 0, 10, 10) for i in range(n)]
+
+
+def test_checkpoint_batches_windows(tmp_path):
+    checkpoint = WindowCheckpoint(tmp_path, {"path": "a.tif"}, shard_windows=4)
+    for i, rio_window in enumerate(windows(10)):
+        checkpoint.save(rio_window, np.array([i], dtype=np.uint64))
+    # two full shards written, two windows still buffered
+    assert len(checkpoint) == 8
+    assert not checkpoint.done(windows(10)[9])
+    checkpoint.flush()
+    assert len(checkpoint) == 10
+    assert len(list(tmp_path.glob("shard-*.parquet"))) == 3
+    assert len((tmp_path / LOG).read_text().splitlines()) == 3
+
+    resumed = WindowCheckpoint(tmp_path, {"path": "a.tif"})
+    assert all(resumed.done(w) for w in windows(10))
+    assert sorted(np.concatenate(list(resumed.shards()))) == list(range(10))
+
+    with pytest.raises(ValueError):
+        WindowCheckpoint(tmp_path, {"path": "b.tif"})
+
+
+def test_checkpoint_torn_log(tmp_path):
+    checkpoint = WindowCheckpoint(tmp_path, {"path": "a.tif"}, shard_windows=2)
+    frame = pd.DataFrame({"h3_index": np.array([1], dtype=np.uint64), "sum": [1.0]})
+    for rio_window in windows(4):
+        checkpoint.save(rio_window, frame)
+    # a crash in the middle of appending the third shard
+    with open(tmp_path / LOG, "a") as f:
+        f.write('{"shard": "shard-000002.parquet", "win')
+
+    resumed = WindowCheckpoint(tmp_path, {"path": "a.tif"}, shard_windows=2)
+    assert len(resumed) == 4
+    resumed.save(windows(5)[4], frame)
+    resumed.flush()
+    assert len(WindowCheckpoint(tmp_path, {"path": "a.tif"})) == 5
+    shards = list(WindowCheckpoint(tmp_path, {"path": "a.tif"}).shards())
+    assert sum(len(shard) for shard in shards) == 5
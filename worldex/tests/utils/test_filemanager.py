@@ -0,0 +1,198 @@
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from worldex.utils.filemanager import DownloadCache, Downloader, DownloadError, Probe
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Static files with ETag and single range support, optionally failing
+    every range request once `fail_after` of them were served
+    """
+
+    etag = '"v1"'
+    ranges = True
+    fail_after = None
+    served = 0
+
+    def log_message(self, *args):
+        pass
+
+    def send_file(self, body: bool):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        start, end = 0, len(data) - 1
+        status = 200
+        header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if self.ranges and header and if_range in (None, self.etag):
+            cls = type(self)
+            if cls.fail_after is not None and cls.served >= cls.fail_after:
+                self.send_error(503)
+                return
+            cls.served += 1
+            start, end = (int(x) for x in header.split("=")[1].split("-"))
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start + 1))
+        if self.etag is not None:
+            self.send_header("ETag", self.etag)
+        if self.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.end_headers()
+        if body:
+            self.wfile.write(data[start : end + 1])
+
+    def do_GET(self):
+        self.send_file(body=True)
+
+    def do_HEAD(self):
+        self.send_file(body=False)
+
+
+@pytest.fixture
+def server(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "data.bin").write_bytes(os.urandom(1_000_003))
+    handler = type("Handler", (RangeHandler,), {})
+    httpd = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(handler, directory=str(served))
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", served, handler
+    httpd.shutdown()
+
+
+def test_download_segments(server, tmp_path):
+    url, served, _ = server
+    downloader = Downloader(segment_size=100_000, retries=0)
+    filename = downloader.download(f"{url}/data.bin", tmp_path / "data.bin")
+    assert filename.read_bytes() == (served / "data.bin").read_bytes()
+    assert downloader.stats["bytes"] == 1_000_003
+    assert not (tmp_path / "data.bin.part.json").exists()
+
+    downloader.download(f"{url}/data.bin", tmp_path / "data.bin")
+    assert downloader.stats["skipped"] == 1
+
+
+def test_download_resume(server, tmp_path):
+    url, served, handler = server
+    handler.fail_after = 4
+    downloader = Downloader(segment_workers=1, segment_size=100_000, retries=0)
+    with pytest.raises(Exception):
+        downloader.download(f"{url}/data.bin", tmp_path / "data.bin")
+    assert not (tmp_path / "data.bin").exists()
+
+    handler.fail_after = None
+    downloader = Downloader(segment_size=100_000, retries=0)
+    downloader.download(f"{url}/data.bin", tmp_path / "data.bin")
+    assert (tmp_path / "data.bin").read_bytes() == (served / "data.bin").read_bytes()
+    assert downloader.stats["resumed"] == 1
+    assert downloader.stats["bytes"] == 600_003
+
+
+def test_download_changed_etag(server, tmp_path):
+    url, served, handler = server
+    handler.fail_after = 4
+    downloader = Downloader(segment_workers=1, segment_size=100_000, retries=0)
+    with pytest.raises(Exception):
+        downloader.download(f"{url}/data.bin", tmp_path / "data.bin")
+
+    # a new version of the file is downloaded from scratch
+    handler.fail_after = None
+    handler.etag = '"v2"'
+    downloader = Downloader(segment_size=100_000, retries=0)
+    downloader.download(f"{url}/data.bin", tmp_path / "data.bin")
+    assert downloader.stats["resumed"] == 0
+    assert (tmp_path / "data.bin").read_bytes() == (served / "data.bin").read_bytes()
+
+
+def test_download_many_without_ranges(server, tmp_path):
+    url, served, handler = server
+    handler.ranges = False
+    (served / "small.txt").write_text("hello")
+    downloader = Downloader(workers=2)
+    results = downloader.download_many(
+        [
+            (f"{url}/data.bin", tmp_path / "data.bin"),
+            (f"{url}/small.txt", tmp_path / "small.txt"),
+            (f"{url}/missing.txt", tmp_path / "missing.txt"),
+        ],
+        ignore_errors=True,
+    )
+    assert results[:2] == [tmp_path / "data.bin", tmp_path / "small.txt"]
+    assert isinstance(results[2], Exception)
+    assert (tmp_path / "small.txt").read_text() == "hello"
+    assert (tmp_path / "data.bin").read_bytes() == (served / "data.bin").read_bytes()
+
+
+def test_download_size_mismatch(server, tmp_path, monkeypatch):
+    url, _, handler = server
+    handler.ranges = False
+    downloader = Downloader()
+    monkeypatch.setattr(downloader, "probe", lambda url: Probe(url, 10))
+    with pytest.raises(DownloadError):
+        downloader.download(f"{url}/data.bin", tmp_path / "data.bin")
+    assert not (tmp_path / "data.bin").exists()
+
+
+def test_download_cache(server, tmp_path):
+    url, served, handler = server
+    (served / "copy.bin").write_bytes((served / "data.bin").read_bytes())
+    (served / "other.bin").write_bytes(os.urandom(500_000))
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1_200_000)
+
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    cache.download(f"{url}/data.bin", first / "data.bin")
+    cache.download(f"{url}/data.bin", second / "data.bin")
+    assert cache.stats["misses"] == 1 and cache.stats["hits"] == 1
+    assert os.path.samefile(first / "data.bin", second / "data.bin")
+    assert cache.downloader.stats["bytes"] == 1_000_003
+
+    # same content under another url is stored once
+    cache.download(f"{url}/copy.bin", second / "copy.bin")
+    assert cache.size() == 1_000_003
+
+    # a new version is a miss, evicting the least recently used download
+    cache.download(f"{url}/other.bin", second / "other.bin")
+    assert cache.stats["evictions"] == 2
+    assert cache.size() == 500_000
+    assert (first / "data.bin").read_bytes() == (served / "data.bin").read_bytes()
+
+    # the index survives across runs
+    cache = DownloadCache(tmp_path / "cache", max_bytes=1_200_000)
+    cache.download(f"{url}/other.bin", first / "other.bin")
+    assert cache.stats["hits"] == 1
+
+    handler.etag = None
+    cache.download(f"{url}/copy.bin", first / "copy.bin")
+    assert cache.stats["bypassed"] == 1
+
+
+def test_download_cache_concurrent_misses(server, tmp_path):
+    url, served, _ = server
+    cache = DownloadCache(
+        tmp_path / "cache", downloader=Downloader(workers=4, segment_size=100_000)
+    )
+    targets = [tmp_path / f"data-{i}.bin" for i in range(4)]
+    results = cache.download_many([(f"{url}/data.bin", target) for target in targets])
+    assert results == targets
+    # the first download is shared with the callers waiting on it
+    assert cache.stats["misses"] == 1 and cache.stats["hits"] == 3
+    assert cache.downloader.stats["bytes"] == 1_000_003
+    for target in targets:
+        assert target.read_bytes() == (served / "data.bin").read_bytes()
+    assert not cache._key_locks
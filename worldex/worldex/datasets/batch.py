@@ -0,0 +1,300 @@
+"""Pipelined download, extraction and indexing of batches of datasets
+"""
+
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+import pandas as pd
+
+from .dataset import BaseDataset
+
+STAGES = ("download", "extract", "index")
+
+# datasets waiting between two stages, a full queue blocks the stage feeding it
+QUEUE_SIZE = 2
+
+_DONE = object()
+
+
+def dir_size(dir: Path) -> int:
+    return sum(path.stat().st_size for path in Path(dir).rglob("*") if path.is_file())
+
+
+class BatchResult(NamedTuple):
+    """Outcome of a dataset, its index or the exception that stopped it"""
+
+    dataset: BaseDataset
+    index: Optional[pd.DataFrame] = None
+    error: Optional[Exception] = None
+
+
+class _Job:
+    def __init__(self, dataset: BaseDataset) -> None:
+        self.dataset = dataset
+        self.bytes: Optional[int] = None
+        self.result = None
+        self.error = None
+
+
+class DiskBudget:
+    """Bytes held on disk by the datasets between download and index.
+
+    The size of a dataset is only known once downloaded, until then it is
+    counted at the mean size of the datasets downloaded so far, and before
+    the first one is, a single dataset is admitted at a time. Another
+    dataset is admitted while the bytes held and expected stay below
+    `max_bytes`, a dataset is always admitted when none is held so one
+    larger than the budget still goes through.
+    """
+
+    def __init__(self, max_bytes: Optional[int]) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.peak = 0
+        self._held = 0
+        self._pending = 0
+        self._measured = 0
+        self._measured_bytes = 0
+        self._cond = threading.Condition()
+
+    def admits(self) -> bool:
+        if self.max_bytes is None or self._held == 0:
+            return True
+        if self._measured == 0:
+            return self._pending == 0
+        expected = self._pending * self._measured_bytes / self._measured
+        return self.used + expected < self.max_bytes
+
+    def acquire(self) -> None:
+        with self._cond:
+            self._cond.wait_for(self.admits)
+            self._held += 1
+            self._pending += 1
+
+    def resize(self, job: _Job, size: int) -> None:
+        with self._cond:
+            if job.bytes is None:
+                job.bytes = 0
+                self._pending -= 1
+                self._measured += 1
+                self._measured_bytes += size
+            self.used += size - job.bytes
+            self.peak = max(self.peak, self.used)
+            job.bytes = size
+            self._cond.notify_all()
+
+    def release(self, job: _Job) -> None:
+        with self._cond:
+            if job.bytes is None:
+                self._pending -= 1
+            else:
+                self.used -= job.bytes
+            job.bytes = None
+            self._held -= 1
+            self._cond.notify_all()
+
+
+class Stage:
+    """Workers running `fn` on the jobs of `inbox` and passing them on.
+
+    Time is split into `busy` running `fn`, `waiting` on an empty inbox and
+    `blocked` on a full outbox, which is the back-pressure of the slower
+    stages downstream. A job that failed skips the remaining stages.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[_Job], None],
+        workers: int,
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        results: queue.Queue,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.results = results
+        self.items = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.blocked = 0.0
+        self._running = workers
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self.work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.stopped = None
+        for thread in self._threads:
+            thread.start()
+
+    def add(self, **seconds) -> None:
+        with self._lock:
+            for key, value in seconds.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def work(self) -> None:
+        while True:
+            start = time.perf_counter()
+            job = self.inbox.get()
+            got = time.perf_counter()
+            self.add(waiting=got - start)
+            if job is _DONE:
+                # let the sibling workers see it, the last one passes it on
+                self.inbox.put(_DONE)
+                with self._lock:
+                    self._running -= 1
+                    last = self._running == 0
+                if last:
+                    self.stopped = time.perf_counter()
+                    self.outbox.put(_DONE)
+                return
+            if job.error is None:
+                try:
+                    self.fn(job)
+                except Exception as e:
+                    job.error = e
+            done = time.perf_counter()
+            self.add(busy=done - got, items=1)
+            # failed jobs go straight to the results
+            (self.outbox if job.error is None else self.results).put(job)
+            self.add(blocked=time.perf_counter() - done)
+
+    @property
+    def stats(self) -> dict:
+        """Seconds per activity summed over workers, and the share of the
+        workers' time spent busy
+        """
+        wall = (self.stopped or time.perf_counter()) - self.started
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "blocked": self.blocked,
+            "utilization": self.busy / (wall * self.workers) if wall > 0 else 0.0,
+        }
+
+
+class BatchRunner:
+    """Download, extract and index many datasets at once.
+
+    Each dataset goes through three stages with their own threads: its
+    files are downloaded, archives GDAL cannot read in place extracted,
+    see `BaseDataset.unzip`, and finally `index` is called, which then
+    finds its files already in place. Stages are connected by bounded
+    queues, so upcoming datasets are downloaded while the current ones are
+    indexed, and a stage that falls behind stalls the stages feeding it
+    instead of letting downloads pile up.
+
+    `max_bytes` bounds the disk held by the datasets downloaded but not
+    yet indexed, see `DiskBudget`. With `cleanup`, the downloaded files of
+    a dataset are removed once indexed, keeping only the index files.
+    Datasets need a `dir`, see `BaseDataset.set_dir`.
+
+    Usage:
+
+    >>> runner = BatchRunner(download_workers=8, max_bytes=20 * 1024**3)
+    >>> for result in runner.run(datasets):
+    >>>     upload(result.dataset.dir)
+    >>> runner.stats["index"]["utilization"]
+    """
+
+    def __init__(
+        self,
+        download_workers: int = 4,
+        extract_workers: int = 1,
+        index_workers: int = 1,
+        max_bytes: Optional[int] = None,
+        queue_size: int = QUEUE_SIZE,
+        cleanup: bool = False,
+        index_kwargs: Optional[dict] = None,
+    ) -> None:
+        self.workers = dict(
+            download=download_workers, extract=extract_workers, index=index_workers
+        )
+        self.max_bytes = max_bytes
+        self.queue_size = queue_size
+        self.cleanup = cleanup
+        self.index_kwargs = index_kwargs or {}
+        self.stages: dict[str, Stage] = {}
+        self.budget = DiskBudget(max_bytes)
+
+    def download(self, job: _Job) -> None:
+        job.dataset.download()
+        self.budget.resize(job, dir_size(job.dataset.dir))
+
+    def extract(self, job: _Job) -> None:
+        job.dataset.unzip()
+        self.budget.resize(job, dir_size(job.dataset.dir))
+
+    def index(self, job: _Job) -> None:
+        job.result = job.dataset.index(**self.index_kwargs)
+
+    def run(self, datasets: Iterable[BaseDataset]) -> Iterator[BatchResult]:
+        """Yield the result of every dataset as soon as it is indexed.
+
+        Results come in completion order, a failed dataset is yielded with
+        its exception and does not stop the batch.
+        """
+        queues = [queue.Queue(self.queue_size) for _ in STAGES]
+        results: queue.Queue = queue.Queue(self.queue_size)
+        fns = dict(download=self.download, extract=self.extract, index=self.index)
+        self.budget = DiskBudget(self.max_bytes)
+        self.stages = {
+            name: Stage(
+                name,
+                fns[name],
+                self.workers[name],
+                queues[i],
+                queues[i + 1] if i + 1 < len(STAGES) else results,
+                results,
+            )
+            for i, name in enumerate(STAGES)
+        }
+        for stage in self.stages.values():
+            stage.start()
+        feeder = threading.Thread(
+            target=self.feed, args=(datasets, queues[0]), daemon=True
+        )
+        feeder.start()
+        while True:
+            job = results.get()
+            if job is _DONE:
+                break
+            self.finish(job)
+            yield BatchResult(job.dataset, job.result, job.error)
+        feeder.join()
+
+    def feed(self, datasets: Iterable[BaseDataset], inbox: queue.Queue) -> None:
+        try:
+            for dataset in datasets:
+                # wait for disk to be freed before admitting another dataset
+                self.budget.acquire()
+                inbox.put(_Job(dataset))
+        finally:
+            inbox.put(_DONE)
+
+    def finish(self, job: _Job) -> None:
+        if self.cleanup:
+            try:
+                job.dataset.clean()
+            except OSError as e:
+                job.error = job.error or e
+        self.budget.release(job)
+
+    @property
+    def stats(self) -> dict:
+        """Per stage `Stage.stats` of the last run, and the peak disk held"""
+        stats = {name: stage.stats for name, stage in self.stages.items()}
+        stats["disk"] = {"max_bytes": self.max_bytes, "peak": self.budget.peak}
+        return stats
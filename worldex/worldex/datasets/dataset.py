@@ -1,13 +1,17 @@
 """Provider for basic datasets
 """
 
+import shutil
 from datetime import date, datetime
+from fnmatch import fnmatch
 from pathlib import Path
 from typing import Optional
 from uuid import uuid4
 
+import numpy as np
 import pandas as pd
-from h3ronpy.arrow import cells_parse, cells_to_string, compact
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pydantic import UUID4, BaseModel, Field
 from pydantic.networks import AnyUrl
 from shapely import wkt
@@ -16,7 +20,36 @@ from typing_extensions import Literal
 
 from ..handlers.raster_handlers import RasterHandler
 from ..handlers.vector_handlers import VectorHandler
+from ..utils.archive import Archive, is_archive
+from ..utils.cells import multiresolution_cells, parse_cells
 from ..utils.deep_merge import deep_merge
+from ..utils.filemanager import DownloadCache
+
+# rows per row group of the h3 files, with cells sorted the min/max statistics
+# of a row group narrow a point lookup down to one or two groups
+H3_ROW_GROUP_SIZE = 64 * 1024
+
+
+def write_cells(df: pd.DataFrame, path: Path) -> None:
+    """Write a frame sorted by its uint64 `h3_index` column to parquet.
+
+    Cells are delta encoded, sorted cells only differ in their low bits,
+    and pages zstd compressed without dictionaries, which only add overhead
+    for unique cells. Row groups carry statistics and a page index so
+    readers can skip every group a cell cannot be in.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(
+        table,
+        path,
+        row_group_size=H3_ROW_GROUP_SIZE,
+        compression="zstd",
+        use_dictionary=False,
+        column_encoding={"h3_index": "DELTA_BINARY_PACKED"},
+        write_statistics=True,
+        write_page_index=True,
+        sorting_columns=[pq.SortingColumn(table.schema.get_field_index("h3_index"))],
+    )
 
 
 class BaseDataset(BaseModel):
@@ -48,14 +81,33 @@ class BaseDataset(BaseModel):
         self._dir.mkdir(exist_ok=True)
         return self
 
+    def set_cache(self, cache: DownloadCache):
+        """Fetch files through a download cache shared with other datasets"""
+        self._cache = cache
+        return self
+
     def write(self, df):
-        compacted_df = pd.DataFrame(
-            {"h3_index": cells_to_string(compact(cells_parse(df.h3_index)))}
-        )
-        df.to_parquet(self.dir / "h3.parquet", index=False)
-        compacted_df.to_parquet(self.dir / "h3-compact.parquet", index=False)
+        """Write the h3 index files and metadata, returning the cells as written.
+
+        `df.h3_index` may hold uint64 cells or strings, every file stores
+        them as uint64 sorted by cell, see `write_cells`. Next to the cells
+        and their compacted set, `h3-multires.parquet` holds the compacted
+        cells and their parents at every coarser resolution, the rows flagged
+        `children_indicator` can be copied as is into h3_children_indicators.
+        """
+        cells = parse_cells(df.h3_index)
+        order = np.argsort(cells, kind="stable")
+        df = df.assign(h3_index=cells).iloc[order].reset_index(drop=True)
+        multires_df = multiresolution_cells(cells)
+        compacted_df = multires_df.loc[
+            ~multires_df.children_indicator, ["h3_index"]
+        ].reset_index(drop=True)
+        write_cells(df, self.dir / "h3.parquet")
+        write_cells(compacted_df, self.dir / "h3-compact.parquet")
+        write_cells(multires_df, self.dir / "h3-multires.parquet")
         with open(self.dir / "metadata.json", "w") as f:
             f.write(self.model_dump_json())
+        return df
 
     def get_base_metadata_schema(self):
         home_url = self._home_url
@@ -145,18 +197,76 @@ class BaseDataset(BaseModel):
     def dir(self):
         return self._dir
 
+    @property
+    def cache(self) -> Optional[DownloadCache]:
+        return getattr(self, "_cache", None)
+
+    def download(self):
+        """Fetch the files of the dataset into `dir`, skipping files already
+        there, so `index` can call it again before reading them.
+        """
+
+    def unzip(self):
+        """Extract the downloaded archives GDAL cannot read in place.
+
+        Zip and tar archives are left as they are, their members are opened
+        in place, see `find_files`. Archives extracted before are skipped.
+        """
+        for file in self.files:
+            path = self.dir / Path(file.split("?")[0]).name
+            if is_archive(path.name) and path.exists():
+                archive = Archive(path)
+                if not archive.streamable:
+                    archive.extract()
+
+    def clean(self):
+        """Remove the downloaded files and extracted archives, keeping the
+        index files and metadata written to `dir`.
+        """
+        for file in self.files:
+            path = self.dir / Path(file.split("?")[0]).name
+            if is_archive(path.name) and not Archive(path).streamable:
+                shutil.rmtree(Archive(path).extract_dir, ignore_errors=True)
+            path.unlink(missing_ok=True)
+
+    def find_files(self, *patterns):
+        """Files in `dir` whose name matches any of the case insensitive glob
+        `patterns`, members of the archives in `dir` included.
+
+        Archive members are returned as GDAL virtual paths handlers open
+        without extracting them, unless they were already extracted into
+        `dir` beside the archive. macOS resource forks are skipped. Paths
+        are returned as absolute strings, like `Archive.member_path`.
+        """
+        found = {}
+        for path in sorted(self.dir.resolve().rglob("*")):
+            if not path.is_file() or "__MACOSX" in str(path):
+                continue
+            if any(fnmatch(path.name.lower(), p.lower()) for p in patterns):
+                found[str(path)] = str(path)
+            if is_archive(path.name):
+                archive = Archive(path)
+                for member in archive.members():
+                    if archive.streamable and (path.parent / member).exists():
+                        continue
+                    name = Path(member).name.lower()
+                    if "__MACOSX" not in member and any(
+                        fnmatch(name, p.lower()) for p in patterns
+                    ):
+                        member_path = archive.member_path(member)
+                        found[member_path] = member_path
+        return list(found)
+
     def index_from_gdf(self, gdf):
         handler = VectorHandler(gdf)
-        h3indices = handler.h3index()
+        h3indices = handler.h3index(as_="uint64")
         self.bbox = wkt.dumps(box(*handler.bbox))
         df = pd.DataFrame({"h3_index": h3indices})
-        self.write(df)
-        return df
+        return self.write(df)
 
     def index_from_riosrc(self, src, window=None):
         handler = RasterHandler(src)
-        h3indices = handler.h3index(window=None)
+        h3indices = handler.h3index(window=None, as_="uint64")
         self.bbox = wkt.dumps(box(*handler.bbox))
         df = pd.DataFrame({"h3_index": h3indices})
-        self.write(df)
-        return df
+        return self.write(df)
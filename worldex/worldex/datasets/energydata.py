@@ -8,13 +8,12 @@ from pathlib import Path
 
 import pandas as pd
 from dateutil import parser
-from pyunpack import Archive
 from shapely import wkt
 from shapely.geometry import box
 from shapely.ops import unary_union
 
 from ..handlers.vector_handlers import VectorHandler
-from ..utils.filemanager import download_file
+from ..utils.filemanager import download_files
 from .dataset import BaseDataset
 
 VALID_TYPES = ["CSV", "Geopackage", "SHP", "GeoJSON"]
@@ -69,42 +68,30 @@ class EnergyDataDataset(BaseDataset):
         obj._dataset = dataset
         return obj
 
-    def unzip(self):
-        """Unzip all files"""
-        for file in filter(
-            lambda x: x.endswith(".zip") or x.endswith(".7z"), self.files
-        ):
-            filename = Path(file).name
-            Archive(self.dir / filename).extractall(self.dir)
-
-    def download(self):
+    def download(self, workers=4):
         resources = self._dataset["resources"]
-        for resource in resources:
-            file = resource["url"]
-            filename = Path(file).name
-            if not os.path.exists(self.dir / filename):
-                download_file(file, self.dir / filename)
+        download_files(
+            [
+                (resource["url"], self.dir / Path(resource["url"]).name)
+                for resource in resources
+                if not os.path.exists(self.dir / Path(resource["url"]).name)
+            ],
+            workers=workers,
+            cache=self.cache,
+        )
 
     def index(self):
         self.download()
         self.unzip()
         boxes = []
         indices = []
-        geo_files = (
-            list(self.dir.glob("**/*.geojson"))
-            + list(self.dir.glob("**/*.GEOJSON"))
-            + list(self.dir.glob("**/*.shp"))
-            + list(self.dir.glob("**/*.SHP"))
-            + list(self.dir.glob("**/*.gpkg"))
-            + list(self.dir.glob("**/*.GPKG"))
-        )
-        for file in filter(lambda file: "__MACOSX" not in str(file), geo_files):
+        geo_files = self.find_files("*.geojson", "*.shp", "*.gpkg")
+        for file in geo_files:
             handler = VectorHandler.from_file(file)
-            h3indices = handler.h3index()
+            h3indices = handler.h3index(as_="uint64")
             boxes.append(box(*handler.bbox))
             indices.append(pd.DataFrame({"h3_index": h3indices}))
 
         self.bbox = wkt.dumps(box(*unary_union(boxes).bounds))
         df = pd.concat(indices).drop_duplicates()
-        self.write(df)
-        return df
+        return self.write(df)
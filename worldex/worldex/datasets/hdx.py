@@ -16,7 +16,7 @@ from shapely.geometry import box
 
 from ..handlers.raster_handlers import RasterHandler
 from ..handlers.vector_handlers import VectorHandler
-from ..utils.filemanager import unzip_file
+from ..utils.archive import Archive
 from .dataset import BaseDataset
 
 VALID_TYPES = ["CSV", "Geopackage", "SHP"]
@@ -87,7 +87,8 @@ class HDXDataset(BaseDataset):
         obj._dataset = dataset
         return obj
 
-    def index(self):
+    def resource(self):
+        """Highest priority resource in a supported format"""
         resources = self._dataset.resources
         sorted_resources = sorted(
             filter(
@@ -98,22 +99,35 @@ class HDXDataset(BaseDataset):
         )
         if len(sorted_resources) == 0:
             raise Exception("Could not find a valid type")
-        resource = sorted_resources[0]
-        filename = Path(resource["download_url"]).name
+        return sorted_resources[0]
 
-        # Skip downloading if file exists in dir
-        file_path = self.dir / filename
+    def resource_path(self, resource) -> Path:
+        return self.dir / Path(resource["download_url"]).name
+
+    def download(self):
+        """Download the highest priority resource, unless already in dir"""
+        resource = self.resource()
+        file_path = self.resource_path(resource)
         if not os.path.exists(file_path):
             _, temp_filename = resource.download(self.dir)
-            if temp_filename != file_path:
+            if Path(temp_filename) != file_path:
                 # hdx has a weird filenaming when downloading files as it append file extensions.
                 # it becomes file.shp.zip.shp this addresses by handling the renaming
-                os.rename(temp_filename, self.dir / filename)
-        # TODO: Figure out how to handle zipped files
+                os.rename(temp_filename, file_path)
+
+    def index(self, workers=None):
+        """Index the highest priority resource.
+
+        `workers` > 1 indexes raster windows or vector chunks over a process
+        pool, csv resources are streamed on a single process.
+        """
+        self.download()
+        resource = self.resource()
+        file_path = self.resource_path(resource)
         if "GeoTIFF" == resource["format"]:
             if file_path.name.endswith(".zip"):
-                unzipped_files = unzip_file(file_path, self.dir)
-                file = list(filter(lambda f: f.name.endswith(".tif"), unzipped_files))
+                # read the GeoTIFF inside the zip in place
+                file = Archive(file_path).find("*.tif", "*.tiff")
                 if len(file) > 0:
                     handler = RasterHandler.from_file(file[0])
                 else:
@@ -133,8 +147,7 @@ class HDXDataset(BaseDataset):
                     handler = VectorHandler.from_file(file_path)
             else:
                 handler = VectorHandler.from_file(file_path)
-        h3indices = handler.h3index()
+        h3indices = handler.h3index(as_="uint64", workers=workers)
         self.bbox = wkt.dumps(box(*handler.bbox))
         df = pd.DataFrame({"h3_index": h3indices})
-        self.write(df)
-        return df
+        return self.write(df)
@@ -1,3 +1,5 @@
+import os
+
 import pandas as pd
 from shapely import wkt
 from shapely.geometry import box
@@ -18,7 +20,8 @@ class UNHCRDataset(BaseDataset):
 
     def download(self):
         for file in self.files:
-            download_file(file, self.dir / "data.geojson")
+            if not os.path.exists(self.dir / "data.geojson"):
+                download_file(file, self.dir / "data.geojson")
 
     def index(self, window=(10, 10)):
         self.download()
@@ -27,10 +30,9 @@ class UNHCRDataset(BaseDataset):
         shp_files = list(self.dir.glob("**/*.geojson"))
         for file in shp_files:
             handler = VectorHandler.from_file(file)
-            h3indices = handler.h3index()
+            h3indices = handler.h3index(as_="uint64")
             boxes.append(box(*handler.bbox))
             indices.append(pd.DataFrame({"h3_index": h3indices}))
         self.bbox = wkt.dumps(box(*unary_union(boxes).bounds))
         df = pd.concat(indices).drop_duplicates()
-        self.write(df)
-        return df
+        return self.write(df)
@@ -2,22 +2,24 @@
 Automates indexing of world pop datasets
 """
 import os
+import shutil
 from datetime import date, datetime
 from pathlib import Path
 from typing import Optional
 from urllib.parse import parse_qs, urlparse
 
+import numpy as np
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
-from pyunpack import Archive
 from shapely import wkt
 from shapely.geometry import box
 from shapely.ops import unary_union
 
 from ..handlers.raster_handlers import RasterHandler
 from ..handlers.vector_handlers import VectorHandler
-from ..utils.filemanager import download_file
+from ..utils.cells import ValueAccumulator
+from ..utils.filemanager import download_files
 from .dataset import BaseDataset
 
 WORLDPOP_API_CACHE = {}
@@ -99,43 +101,72 @@ class WorldPopDataset(BaseDataset):
         ]
         return f"https://hub.worldpop.org/rest/data/{category_alias}/{listing_alias}/?id={data_id}"
 
-    def download(self):
-        """Download all files"""
-        for file in self.files:
-            filename = Path(file).name
-            if not os.path.exists(self.dir / filename):
-                # TODO: https download is way slower than using worldpop ftp
-                download_file(file, self.dir / filename)
-
-    def unzip(self):
-        """Unzip all files"""
-        for file in filter(
-            lambda x: x.endswith(".zip") or x.endswith(".7z"), self.files
-        ):
-            filename = Path(file).name
-            Archive(self.dir / filename).extractall(self.dir)
-
-    def index(self, window=(10, 10)):
+    def download(self, workers=4):
+        """Download all missing files concurrently"""
+        download_files(
+            [
+                (file, self.dir / Path(file).name)
+                for file in self.files
+                if not os.path.exists(self.dir / Path(file).name)
+            ],
+            workers=workers,
+            cache=self.cache,
+        )
+
+    def index(self, window=(10, 10), checkpoint=False, agg=None):
+        """Index all downloaded files.
+
+        With `checkpoint=True` the cells of every finished raster window are
+        kept under `dir/checkpoints/`, so an interrupted run picks up where it
+        stopped. The checkpoints are removed once the index is written.
+
+        `agg`, e.g. `["sum"]` for population counts, adds per-cell aggregates
+        of the raster values as extra columns of `h3.parquet`.
+        """
         self.download()
         self.unzip()
         boxes = []
         indices = []
+        # rasters sharing cells, like an age and sex stack, are aggregated together
+        values = ValueAccumulator()
+        checkpoints_dir = self.dir / "checkpoints"
         # TODO: figure out a better way to handle this
-        tif_files = list(self.dir.glob("**/*.tif")) + list(self.dir.glob("**/*.TIF"))
+        tif_files = self.find_files("*.tif")
         for file in tif_files:
             handler = RasterHandler.from_file(file)
-            h3indices = handler.h3index(window=window)
+            h3indices = handler.h3index(
+                window=window,
+                as_="uint64",
+                checkpoint=checkpoints_dir / Path(file).stem if checkpoint else None,
+                # partial aggregates, combined across rasters below
+                agg=("count", "sum", "max") if agg else None,
+            )
             boxes.append(box(*handler.bbox))
-            indices.append(pd.DataFrame({"h3_index": h3indices}))
-        shp_files = list(self.dir.glob("**/*.shp")) + list(self.dir.glob("**/*.SHP"))
+            if agg:
+                # cells without values have no max
+                values.add(h3indices.fillna({"max": -np.inf}))
+            else:
+                indices.append(pd.DataFrame({"h3_index": h3indices}))
+        shp_files = self.find_files("*.shp")
         for file in shp_files:
             handler = VectorHandler.from_file(file)
-            h3indices = handler.h3index()
+            h3indices = handler.h3index(as_="uint64")
             boxes.append(box(*handler.bbox))
-            indices.append(pd.DataFrame({"h3_index": h3indices}))
+            if agg:
+                values.add(
+                    pd.DataFrame(
+                        {"h3_index": h3indices, "count": 0, "sum": 0.0, "max": -np.inf}
+                    )
+                )
+            else:
+                indices.append(pd.DataFrame({"h3_index": h3indices}))
         self.bbox = wkt.dumps(box(*unary_union(boxes).bounds))
-        df = pd.concat(indices).drop_duplicates()
-        self.write(df)
+        if agg:
+            df = values.to_frame(agg)
+        else:
+            df = pd.concat(indices).drop_duplicates(subset="h3_index")
+        df = self.write(df)
+        shutil.rmtree(checkpoints_dir, ignore_errors=True)
         return df
 
     def get_specific_metadata_schema(self):
@@ -1,2 +1,87 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional
+
+import shapely
+from shapely import Geometry
+
+from ..types import Aoi
+
+# approximate length of one degree at the equator, in meters
+METERS_PER_DEGREE = 111_320
+
+# tasks submitted to a pool per worker ahead of the results consumed, so
+# only a few windows or chunks are held in memory at any time
+TASKS_PER_WORKER = 2
+
+
+def aoi_geometry(aoi: Aoi) -> Geometry:
+    """Area of interest as a geometry, bounds are converted to a box"""
+    if isinstance(aoi, Geometry):
+        return aoi
+    return shapely.box(*aoi)
+
+
+def _init_worker(initializer: Optional[Callable], initargs: tuple) -> None:
+    # each worker already owns a core, keep h3ronpy from spawning a thread pool per process
+    os.environ.setdefault("RAYON_NUM_THREADS", "1")
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def spawn_pool(
+    workers: int, initializer: Optional[Callable] = None, initargs: tuple = ()
+) -> ProcessPoolExecutor:
+    """Process pool of `workers` fresh interpreters, each running
+    `initializer(*initargs)` once
+    """
+    # h3ronpy's thread pool does not survive a fork, always spawn fresh workers
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(initializer, initargs),
+    )
+
+
+def map_unordered(
+    fn: Callable,
+    items: Iterable,
+    workers: Optional[int] = None,
+    *args,
+    initializer: Optional[Callable] = None,
+    initargs: tuple = (),
+) -> Iterator:
+    """Yield `fn(item, *args)` for every item, in completion order.
+
+    With `workers` > 1 the items are fanned out to a `spawn_pool`. Items are
+    pulled lazily and at most `TASKS_PER_WORKER` tasks per worker are in
+    flight, each result is dropped by the pool once yielded.
+    """
+    if workers is None or workers <= 1:
+        for item in items:
+            yield fn(item, *args)
+        return
+    with spawn_pool(workers, initializer, initargs) as executor:
+        pending = set()
+        for item in items:
+            if len(pending) >= workers * TASKS_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(fn, item, *args))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
 class BaseHandler:
     default_resolution: int = 8
+    resolution: Optional[int] = None
+
+    def get_resolution(self) -> int:
+        if self.resolution is None:
+            return self.default_resolution
+        return self.resolution
@@ -1,71 +1,846 @@
-from typing import List, Optional, Tuple
+import math
+import os
+import sys
+import time
+from typing import Iterable, Iterator, Literal, Optional, Sequence, Tuple, Union
 
+import h3
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyproj
 import rasterio as rio
-from h3ronpy.arrow import cells_to_string
-from h3ronpy.pandas.raster import raster_to_dataframe
+import shapely
+from affine import Affine
+from h3ronpy.arrow import grid_disk
+from h3ronpy.arrow.vector import cells_to_coordinates, cells_to_wkb_polygons
+from pyproj.enums import TransformDirection
+from rasterio.enums import MaskFlags
+from rasterio.features import rasterize, shapes
+from rasterio.transform import array_bounds
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window, from_bounds, intersect
+from shapely.geometry import shape
 
-from ..types import File
-from .base import BaseHandler
+from ..types import Aoi, Cells, File
+from ..utils.archive import is_vsi, local_path
+from ..utils.cells import (
+    AGGREGATIONS,
+    CellAccumulator,
+    ValueAccumulator,
+    format_cells,
+    group_values,
+    polyfill_wkb,
+)
+from ..utils.checkpoint import WindowCheckpoint, window_layout
+from ..utils.cover import hierarchical_cover
+from .base import METERS_PER_DEGREE, BaseHandler, aoi_geometry, map_unordered
+
+try:
+    import resource
+except ImportError:  # resource is only available on unix
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of the current process in MB"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes while macos reports bytes
+    if sys.platform == "darwin":
+        return maxrss / 1024**2
+    return maxrss / 1024
+
+
+# windows overlap their neighbours by this many pixels per side, cells are
+# decided by the pixel under their centroid so the overlap only repeats a few
+# cells, and it keeps simplified polygons whole across window edges
+WINDOW_PAD_PIXELS = 3
+
+# the default read goes through block windows of about this many (rows, cols)
+# pixels, which keeps its memory bounded on large rasters
+DEFAULT_BLOCK_SHAPE = (2048, 2048)
+
+# engine="auto" polygonizes masks with at most this many pixels per cell and
+# this many pixel edges between valid and invalid pixels per expected cell,
+# see benchmarks/raster_engines.py
+POLYGONIZE_MAX_PIXELS_PER_CELL = 16
+POLYGONIZE_MAX_EDGES_PER_CELL = 1
+
+ENGINES = ("pixels", "polygonize", "auto")
+
+REPROJECTIONS = ("warp", "centroids")
+
+
+# Handler opened once per pool worker by `_open_worker_handler`
+_WORKER_HANDLER = None
+
+
+def _open_worker_handler(path: str, options: dict) -> None:
+    global _WORKER_HANDLER
+    _WORKER_HANDLER = RasterHandler.from_file(path, **options)
+
+
+def _worker_call(rio_window: Window, method: str) -> Tuple[Window, object]:
+    return rio_window, getattr(_WORKER_HANDLER, method)(rio_window)
+
+
+def any_pool(mask: np.ndarray, pool: int) -> np.ndarray:
+    """Reduce a boolean mask by `pool` x `pool` blocks, keeping blocks with any True pixel"""
+    if pool == 1:
+        return mask
+    rows = math.ceil(mask.shape[0] / pool)
+    cols = math.ceil(mask.shape[1] / pool)
+    padded = np.zeros((rows * pool, cols * pool), dtype=bool)
+    padded[: mask.shape[0], : mask.shape[1]] = mask
+    return padded.reshape(rows, pool, cols, pool).any(axis=(1, 3))
+
+
+def fragmentation(mask: np.ndarray) -> float:
+    """Number of edges between valid and invalid pixels per valid pixel"""
+    valid = np.count_nonzero(mask)
+    if valid == 0:
+        return 0.0
+    edges = np.count_nonzero(mask[1:] != mask[:-1]) + np.count_nonzero(
+        mask[:, 1:] != mask[:, :-1]
+    )
+    return edges / valid
 
 
 class RasterHandler(BaseHandler):
-    def __init__(self, rio_src, resolution: Optional[int] = None) -> None:
+    """Index the valid pixels of a raster.
+
+    `bands` selects the bands read in a single pass per window (band 1 by
+    default). A pixel is valid when `band_mask="any"` of the bands, or
+    `band_mask="all"` of them, hold data.
+
+    `engine` picks how valid pixels become cells:
+
+    - "pixels": sample the pixel under each cell centroid (default)
+    - "polygonize": vectorize the validity mask and polyfill the polygons,
+      optionally simplified to the H3 edge length with `simplify=True`
+    - "auto": polygonize windows with few pixels per cell whose mask has few
+      edges per expected cell
+
+    Rasters that are not in EPSG:4326 are warped on the fly by default
+    (`reproject="warp"`). `reproject="centroids"` skips warping entirely: the
+    cells covering a window are listed in lon/lat, their centroids are
+    projected in bulk to the native CRS with pyproj and looked up in the
+    native pixel grid. That is the same centroid rule the pixel engine
+    applies, at a cost proportional to the number of cells.
+    """
+
+    def __init__(
+        self,
+        rio_src,
+        resolution: Optional[int] = None,
+        bands: Optional[Sequence[int]] = None,
+        band_mask: Literal["any", "all"] = "any",
+        engine: Literal["pixels", "polygonize", "auto"] = "pixels",
+        simplify: bool = False,
+        reproject: Literal["warp", "centroids"] = "warp",
+    ) -> None:
+        # path is needed to reopen the dataset in worker processes
+        self.path = getattr(rio_src, "name", None)
+        if reproject not in REPROJECTIONS:
+            raise ValueError(
+                f"reproject must be one of {REPROJECTIONS}, got {reproject!r}"
+            )
+        if reproject == "centroids" and engine != "pixels":
+            raise ValueError('reproject="centroids" only supports engine="pixels"')
+        self.reproject = reproject
+        self.transformer = None
         # h3 indexes are standardized to use epsg:4326 projection
-        if rio_src.crs != "EPSG:4326":
-            self.src = rio.vrt.WarpedVRT(rio_src, crs="EPSG:4326")
-        else:
+        if rio_src.crs == "EPSG:4326":
+            self.src = rio_src
+        elif reproject == "centroids":
             self.src = rio_src
+            self.transformer = pyproj.Transformer.from_crs(
+                rio_src.crs.to_wkt(), "EPSG:4326", always_xy=True
+            )
+        else:
+            self.src = rio.vrt.WarpedVRT(rio_src, crs="EPSG:4326")
         self.resolution = resolution
+        self.bands = list(bands) if bands is not None else [1]
+        if band_mask not in ("any", "all"):
+            raise ValueError(f"band_mask must be 'any' or 'all', got {band_mask!r}")
+        self.band_mask = band_mask
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, got {engine!r}")
+        self.engine = engine
+        self.simplify = simplify
+        self.stats: dict = {}
 
     @classmethod
-    def from_file(cls, file: File, resolution: Optional[int] = None):
+    def from_file(cls, file: File, resolution: Optional[int] = None, **kwargs):
         src = rio.open(file)
-        return cls(src, resolution)
+        return cls(src, resolution, **kwargs)
+
+    @property
+    def options(self) -> dict:
+        """Keyword arguments needed to recreate this handler from its path"""
+        return dict(
+            resolution=self.resolution,
+            bands=self.bands,
+            band_mask=self.band_mask,
+            engine=self.engine,
+            simplify=self.simplify,
+            reproject=self.reproject,
+        )
+
+    def fingerprint(self) -> dict:
+        """Identify the source file and options a checkpoint was created with"""
+        if self.path is None:
+            raise ValueError("Checkpoints require a raster opened from a path")
+        # archive members are identified by their path and the archive's stat
+        stat = os.stat(local_path(self.path))
+        return dict(
+            path=self.path if is_vsi(self.path) else os.path.abspath(self.path),
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            **self.options,
+        )
+
+    def pixel_size(self) -> Tuple[float, float]:
+        """Approximate (x, y) size of a pixel in degrees"""
+        xres, yres = map(abs, self.src.res)
+        if self.src.crs.is_projected:
+            meters = self.src.crs.linear_units_factor[1]
+            return (
+                xres * meters / METERS_PER_DEGREE,
+                yres * meters / METERS_PER_DEGREE,
+            )
+        return xres, yres
+
+    def pad_window(self, rio_window: Window, pad: int) -> Window:
+        """Grow a window by `pad` pixels on each side, clipped to the raster"""
+        full = Window(0, 0, self.src.width, self.src.height)
+        return Window(
+            rio_window.col_off - pad,
+            rio_window.row_off - pad,
+            rio_window.width + 2 * pad,
+            rio_window.height + 2 * pad,
+        ).intersection(full)
+
+    def block_windows(
+        self,
+        block_shape: Optional[Tuple[int, int]] = None,
+        pad: int = WINDOW_PAD_PIXELS,
+    ) -> Iterator[Window]:
+        """Iterate over windows following the internal tiling of the raster.
+
+        `block_shape` (rows, cols) is rounded up to a multiple of the internal
+        block shape so that no block is decompressed more than once. Windows
+        are padded by `pad` pixels, `WINDOW_PAD_PIXELS` by default.
+        """
+        if block_shape is None:
+            for _, block_window in self.src.block_windows(1):
+                yield self.pad_window(block_window, pad)
+            return
+        internal_rows, internal_cols = self.src.block_shapes[0]
+        rows = max(1, -(-block_shape[0] // internal_rows)) * internal_rows
+        cols = max(1, -(-block_shape[1] // internal_cols)) * internal_cols
+        for row_off in range(0, self.src.height, rows):
+            for col_off in range(0, self.src.width, cols):
+                block_window = Window(
+                    col_off,
+                    row_off,
+                    min(cols, self.src.width - col_off),
+                    min(rows, self.src.height - row_off),
+                )
+                yield self.pad_window(block_window, pad)
+
+    def plan_block_shape(self, window: Tuple[int, int]) -> Tuple[int, int]:
+        """Block shape (rows, cols) splitting the raster into `window` = (columns, rows)"""
+        return (
+            math.ceil(self.src.height / window[1]),
+            math.ceil(self.src.width / window[0]),
+        )
+
+    def plan_windows(
+        self, window: Tuple[int, int], overlap: int = 0
+    ) -> Iterator[Window]:
+        """Split the raster into roughly `window` = (columns, rows) windows.
+
+        Windows are pixel aligned and snapped to the internal block grid, so
+        reads never resample, and together they find every cell of a single
+        read. `overlap` optionally pads each window further by that many H3
+        edge lengths.
+        """
+        block_shape = self.plan_block_shape(window)
+        pad = 0
+        if overlap:
+            edge_degrees = (
+                h3.edge_length(self.get_resolution(), "m") / METERS_PER_DEGREE
+            )
+            pad = overlap * math.ceil(edge_degrees / min(self.pixel_size()))
+        for rio_window in self.block_windows(block_shape):
+            yield self.pad_window(rio_window, pad)
+
+    def aoi_window(self, aoi: Aoi) -> Optional[Window]:
+        """Window of the raster covering an area of interest in EPSG:4326, or
+        None when they do not overlap.
 
-    def get_resolution(self) -> int:
-        if self.resolution is None:
-            return self.default_resolution
-        return self.resolution
+        The window is padded by two H3 edge lengths, so cells along the AOI
+        boundary are read with all of their pixels.
+        """
+        bounds = aoi_geometry(aoi).bounds
+        if self.transformer is not None:
+            bounds = transform_bounds("EPSG:4326", self.src.crs, *bounds)
+        window = from_bounds(*bounds, transform=self.src.transform)
+        col_off = math.floor(window.col_off)
+        row_off = math.floor(window.row_off)
+        window = Window(
+            col_off,
+            row_off,
+            math.ceil(window.col_off + window.width) - col_off,
+            math.ceil(window.row_off + window.height) - row_off,
+        )
+        edge_degrees = h3.edge_length(self.get_resolution(), "m") / METERS_PER_DEGREE
+        pad = max(
+            WINDOW_PAD_PIXELS, 2 * math.ceil(edge_degrees / min(self.pixel_size()))
+        )
+        window = Window(
+            window.col_off - pad,
+            window.row_off - pad,
+            window.width + 2 * pad,
+            window.height + 2 * pad,
+        )
+        full = Window(0, 0, self.src.width, self.src.height)
+        if not intersect(window, full):
+            return None
+        return window.intersection(full)
 
-    def h3index(self, window: Optional[Tuple[int, int]] = None) -> List[int]:
+    def clip_windows(
+        self, windows: Iterable[Window], region: Optional[Window]
+    ) -> Iterator[Window]:
+        """Parts of the windows inside `region`, windows outside it are dropped"""
+        if region is None:
+            return
+        for rio_window in windows:
+            if intersect(rio_window, region):
+                yield rio_window.intersection(region)
+
+    def inside_aoi(self, cells: np.ndarray, aoi: Aoi) -> np.ndarray:
+        """Boolean mask of the cells whose centroid lies in the area of interest"""
+        centroids = cells_to_coordinates(pa.array(cells, type=pa.uint64()))
+        return shapely.intersects_xy(
+            aoi_geometry(aoi),
+            centroids["lng"].to_numpy(),
+            centroids["lat"].to_numpy(),
+        )
+
+    def band_validity(
+        self,
+        band: int,
+        data: np.ndarray,
+        rio_window: Window,
+        out_shape: Optional[Tuple[int, int]] = None,
+    ) -> np.ndarray:
+        """Boolean mask of the pixels of `band` that hold data"""
+        flags = self.src.mask_flag_enums[band - 1]
+        if MaskFlags.all_valid in flags:
+            return np.ones(data.shape, dtype=bool)
+        if MaskFlags.nodata in flags:
+            nodata = self.src.nodatavals[band - 1]
+            if np.isnan(nodata):
+                return ~np.isnan(data)
+            return data != np.array(nodata, dtype=data.dtype)
+        # internal mask or alpha band
+        return self.src.read_masks(band, window=rio_window, out_shape=out_shape) > 0
+
+    def read_validity(
+        self, rio_window: Window, out_shape: Optional[Tuple[int, int]] = None
+    ) -> np.ndarray:
+        """Read all selected bands in one pass and reduce them to a single validity mask"""
+        data = self.src.read(
+            self.bands,
+            window=rio_window,
+            out_shape=(len(self.bands), *out_shape) if out_shape else None,
+        )
+        valid = np.stack(
+            [
+                self.band_validity(band, band_data, rio_window, out_shape)
+                for band, band_data in zip(self.bands, data)
+            ]
+        )
+        reduce = np.any if self.band_mask == "any" else np.all
+        return reduce(valid, axis=0)
+
+    def window_to_cells(self, rio_window: Window) -> np.ndarray:
+        """Read a single window of the selected bands and return its unique cells as uint64"""
+        return self.mask_to_cells(
+            self.read_validity(rio_window), self.src.window_transform(rio_window)
+        )
+
+    def mask_to_cells(self, valid: np.ndarray, transform: Affine) -> np.ndarray:
+        """Unique cells as uint64 whose centroid falls on a valid pixel of the mask"""
+        engine = "pixels" if self.transformer is not None else self.engine
+        if engine == "auto":
+            pixel_km2 = abs(transform.a * transform.e) * (METERS_PER_DEGREE / 1000) ** 2
+            pixels_per_cell = h3.hex_area(self.get_resolution(), "km^2") / pixel_km2
+            engine = (
+                "polygonize"
+                if pixels_per_cell <= POLYGONIZE_MAX_PIXELS_PER_CELL
+                and fragmentation(valid) * pixels_per_cell
+                <= POLYGONIZE_MAX_EDGES_PER_CELL
+                else "pixels"
+            )
+        if engine == "polygonize":
+            return self.polygonize_to_cells(valid, transform)
+        return self.sample_centroids(valid, transform)
+
+    def sample_centroids(self, valid: np.ndarray, transform: Affine) -> np.ndarray:
+        """Unique cells as uint64 whose centroid falls on a valid pixel of a mask.
+
+        The cells whose centroid lies in the footprint of the mask are listed,
+        and their centroids, projected to the native CRS of the raster with
+        `reproject="centroids"`, are looked up in the pixel grid. Every cell is
+        decided by the single pixel under its centroid, so any split of the
+        raster into windows finds the same cells as a full read.
+        """
+        if not valid.any():
+            return np.empty(0, dtype=np.uint64)
+        west, south, east, north = array_bounds(*valid.shape, transform)
+        footprint = shapely.box(west, south, east, north)
+        if self.transformer is not None:
+            # densified so its edges follow the projection in lon/lat
+            footprint = shapely.transform(
+                shapely.segmentize(footprint, max(east - west, north - south) / 16),
+                lambda coords: np.column_stack(
+                    self.transformer.transform(coords[:, 0], coords[:, 1])
+                ),
+            )
+        cells = polyfill_wkb(
+            [shapely.to_wkb(footprint)], self.get_resolution(), "centroid"
+        )
+        centroids = cells_to_coordinates(cells)
+        xs, ys = centroids["lng"].to_numpy(), centroids["lat"].to_numpy()
+        if self.transformer is not None:
+            xs, ys = self.transformer.transform(
+                xs, ys, direction=TransformDirection.INVERSE
+            )
+        cols, rows = ~transform * (xs, ys)
+        rows = np.floor(rows).astype(np.int64)
+        cols = np.floor(cols).astype(np.int64)
+        inside = (rows >= 0) & (rows < valid.shape[0]) & (cols >= 0)
+        inside &= cols < valid.shape[1]
+        hits = np.zeros(len(rows), dtype=bool)
+        hits[inside] = valid[rows[inside], cols[inside]]
+        return np.unique(cells.to_numpy(zero_copy_only=False)[hits])
+
+    def mask_polygons(self, valid: np.ndarray, transform: Affine) -> np.ndarray:
+        """Polygons of the valid pixels, simplified with `simplify`"""
+        geoms = np.array(
+            [
+                shape(geom)
+                for geom, _ in shapes(
+                    valid.view(np.uint8), mask=valid, transform=transform
+                )
+            ]
+        )
+        if self.simplify:
+            edge_degrees = (
+                h3.edge_length(self.get_resolution(), "m") / METERS_PER_DEGREE
+            )
+            geoms = shapely.simplify(geoms, edge_degrees)
+        return geoms
+
+    def polygonize_to_cells(self, valid: np.ndarray, transform: Affine) -> np.ndarray:
+        """Vectorize the valid pixels and polyfill the resulting polygons.
+
+        Cells are kept when their centroid lies inside a polygon, the same rule
+        the pixel engine applies to the same validity mask, internal masks and
+        alpha bands included. Both engines, and so "auto" whichever it picks
+        for a window, agree unless `simplify` is set.
+        """
+        if not valid.any():
+            return np.empty(0, dtype=np.uint64)
+        geoms = self.mask_polygons(valid, transform)
+        cells = polyfill_wkb(shapely.to_wkb(geoms), self.get_resolution(), "centroid")
+        return cells.unique().to_numpy(zero_copy_only=False)
+
+    def h3index_adaptive(self, rio_window: Window, aoi: Optional[Aoi]) -> np.ndarray:
+        """Compact cells as uint64 of a single window, through a
+        `hierarchical_cover` of its polygonized validity mask.
+        """
+        valid = self.read_validity(rio_window)
+        if not valid.any():
+            return np.empty(0, dtype=np.uint64)
+        geoms = self.mask_polygons(valid, self.src.window_transform(rio_window))
+        if aoi is not None:
+            geoms = shapely.intersection(geoms, aoi_geometry(aoi))
+        return hierarchical_cover(geoms, self.get_resolution(), "centroid")
+
+    def window_to_values(self, rio_window: Window) -> pd.DataFrame:
+        """Partial per-cell aggregates of the pixel values of an unpadded window.
+
+        Each valid pixel counts towards the cell containing its centre. The
+        cells covering the window are burnt into a label raster matching the
+        pixel grid, so grouping values by cell is a `np.bincount` over labels.
+        Cells covered by the padded window without holding a pixel centre are
+        included with a `count` of 0.
+        """
+        band = self.bands[0]
+        padded = self.pad_window(rio_window, WINDOW_PAD_PIXELS)
+        data = self.src.read(band, window=padded)
+        valid = self.band_validity(band, data, padded)
+        covered = self.mask_to_cells(valid, self.src.window_transform(padded))
+
+        # restrict values to the window itself, neighbouring windows own the padding
+        rows = slice(
+            int(rio_window.row_off - padded.row_off),
+            int(rio_window.row_off - padded.row_off + rio_window.height),
+        )
+        cols = slice(
+            int(rio_window.col_off - padded.col_off),
+            int(rio_window.col_off - padded.col_off + rio_window.width),
+        )
+        data, valid = data[rows, cols], valid[rows, cols]
+        transform = self.src.window_transform(rio_window)
+        cells = self.cover_cells(valid.shape, transform)
+        labels = self.label_pixels(cells, valid.shape, transform)
+        index = labels[valid] - 1
+        if (index < 0).any():
+            raise ValueError(
+                f"{np.count_nonzero(index < 0)} valid pixels of {rio_window} "
+                "fall outside the cells covering it"
+            )
+        values = data[valid].astype(np.float64)
+        count = np.bincount(index, minlength=len(cells))
+        total = np.bincount(index, weights=values, minlength=len(cells))
+        maximum = np.full(len(cells), -np.inf)
+        np.maximum.at(maximum, index, values)
+        # only cells holding a pixel centre, the cover also reaches past the window
+        held = count > 0
+        return group_values(
+            np.concatenate([cells[held], covered]),
+            np.concatenate([count[held], np.zeros(len(covered))]),
+            np.concatenate([total[held], np.zeros(len(covered))]),
+            np.concatenate([maximum[held], np.full(len(covered), -np.inf)]),
+        )
+
+    def cover_cells(self, shape: Tuple[int, int], transform: Affine) -> np.ndarray:
+        """Unique cells as uint64 intersecting the footprint of an array.
+
+        h3ronpy's polyfill misses some cells along the footprint edges, so the
+        cover is grown by one ring of neighbours to hold every pixel centre.
+        """
+        west, south, east, north = array_bounds(*shape, transform)
+        footprint = shapely.box(west, south, east, north)
+        if self.transformer is not None:
+            footprint = shapely.transform(
+                shapely.segmentize(footprint, max(east - west, north - south) / 16),
+                lambda coords: np.column_stack(
+                    self.transformer.transform(coords[:, 0], coords[:, 1])
+                ),
+            )
+        cells = polyfill_wkb(
+            [shapely.to_wkb(footprint)], self.get_resolution(), "intersects"
+        ).unique()
+        return grid_disk(cells, 1, flatten=True).unique().to_numpy(zero_copy_only=False)
+
+    def label_pixels(
+        self, cells: np.ndarray, shape: Tuple[int, int], transform: Affine
+    ) -> np.ndarray:
+        """Raster of 1-based positions in `cells` of the cell containing each pixel centre"""
+        if len(cells) == 0:
+            return np.zeros(shape, dtype=np.int32)
+        polygons = shapely.from_wkb(
+            np.asarray(cells_to_wkb_polygons(pa.array(cells, type=pa.uint64())))
+        )
+        coords, index = shapely.get_coordinates(polygons, return_index=True)
+        if self.transformer is not None:
+            coords = np.column_stack(
+                self.transformer.transform(
+                    coords[:, 0], coords[:, 1], direction=TransformDirection.INVERSE
+                )
+            )
+        # plain geojson rings rasterize much faster than shapely geometries
+        rings = np.split(coords, np.flatnonzero(np.diff(index)) + 1)
+        return rasterize(
+            (
+                ({"type": "Polygon", "coordinates": [ring.tolist()]}, label)
+                for label, ring in enumerate(rings, 1)
+            ),
+            out_shape=shape,
+            transform=transform,
+            fill=0,
+            dtype="int32",
+        )
+
+    def decimation(self) -> int:
+        """Number of source pixels that fit along one H3 edge at the target resolution"""
+        edge_degrees = h3.edge_length(self.get_resolution(), "m") / METERS_PER_DEGREE
+        return max(1, int(edge_degrees // max(self.pixel_size())))
+
+    def h3index_overviews(
+        self, chunk_size: int = 4096, region: Optional[Window] = None
+    ) -> np.ndarray:
+        """Index from a decimated copy of the raster whose pixels are just finer
+        than the H3 edge length at the target resolution.
+
+        The closest internal overview is used when the file has one, and the
+        remaining decimation is an "any valid pixel" reduction, so a decimated
+        pixel is valid whenever one of its source pixels is. Only overviews
+        built with a conservative resampling (e.g. average, which skips nodata)
+        keep that guarantee, build them accordingly.
+
+        `region` restricts the read to a window of the raster.
+        """
+        if region is None:
+            region = Window(0, 0, self.src.width, self.src.height)
+        factor = self.decimation()
+        overview = max(
+            (f for f in self.src.overviews(self.bands[0]) if f <= factor), default=1
+        )
+        pool = factor // overview
+        # decimated pixels span `step` source pixels, chunks hold whole decimated pixels
+        step = overview * pool
+        chunk = max(step, chunk_size // step * step)
+        cells = CellAccumulator()
+        row_end = region.row_off + region.height
+        col_end = region.col_off + region.width
+        for row_off in range(region.row_off, row_end, chunk):
+            for col_off in range(region.col_off, col_end, chunk):
+                rio_window = Window(
+                    col_off,
+                    row_off,
+                    min(chunk, col_end - col_off),
+                    min(chunk, row_end - row_off),
+                )
+                # pad by whole decimated pixels to keep them aligned
+                rio_window = self.pad_window(rio_window, WINDOW_PAD_PIXELS * step)
+                out_shape = (
+                    math.ceil(rio_window.height / overview),
+                    math.ceil(rio_window.width / overview),
+                )
+                valid = any_pool(self.read_validity(rio_window, out_shape), pool)
+                transform = self.src.window_transform(rio_window) * Affine.scale(step)
+                cells.add(self.mask_to_cells(valid, transform))
+        self.stats = {"overview": overview, "decimation": step}
+        return cells.to_numpy()
+
+    def map_windows(
+        self,
+        windows: Iterable[Window],
+        workers: Optional[int] = None,
+        method: str = "window_to_cells",
+    ) -> Iterator[Tuple[Window, object]]:
+        """Yield each window with the result of `method` on it, by default its
+        unique cells, in completion order.
+
+        With `workers` > 1 the windows are fanned out to a process pool where
+        every worker reopens the dataset by path, see `map_unordered`.
+        """
+        if workers is None or workers <= 1:
+            for rio_window in windows:
+                yield rio_window, getattr(self, method)(rio_window)
+            return
+        if self.path is None:
+            raise ValueError("Parallel indexing requires a raster opened from a path")
+        yield from map_unordered(
+            _worker_call,
+            windows,
+            workers,
+            method,
+            initializer=_open_worker_handler,
+            initargs=(self.path, self.options),
+        )
+
+    def index_windows(
+        self,
+        windows: Iterable[Window],
+        workers: Optional[int] = None,
+        checkpoint: Optional[File] = None,
+        values: bool = False,
+        aoi: Optional[Aoi] = None,
+    ) -> Union[CellAccumulator, ValueAccumulator]:
+        """Collect the cells of all windows, or with `values` their partial
+        aggregates from `window_to_values`.
+
+        With a `checkpoint` directory the cells of finished windows are
+        persisted in batches as they complete, see `WindowCheckpoint`. Windows already recorded there by an
+        interrupted run are skipped and their shards merged instead. `aoi` is
+        only recorded in the checkpoint, windows are expected to be clipped.
+        """
+        cells = ValueAccumulator() if values else CellAccumulator()
+        method = "window_to_values" if values else "window_to_cells"
+        spill = None
+        if checkpoint is not None:
+            # window keys only match on resume with the same windows
+            windows = list(windows)
+            spill = WindowCheckpoint(
+                checkpoint,
+                dict(
+                    self.fingerprint(),
+                    values=values,
+                    aoi=aoi_geometry(aoi).wkt if aoi is not None else None,
+                    windows=window_layout(windows),
+                ),
+            )
+            for shard_cells in spill.shards():
+                cells.add(shard_cells)
+            windows = [w for w in windows if not spill.done(w)]
+        try:
+            for rio_window, window_cells in self.map_windows(windows, workers, method):
+                if spill is not None:
+                    spill.save(rio_window, window_cells)
+                cells.add(window_cells)
+        finally:
+            # keep the windows finished before an interruption too
+            if spill is not None:
+                spill.flush()
+        return cells
+
+    def h3index_stream(
+        self,
+        block_shape: Optional[Tuple[int, int]] = None,
+        workers: Optional[int] = None,
+        as_: str = "string",
+        checkpoint: Optional[File] = None,
+        agg: Optional[Sequence[str]] = None,
+        aoi: Optional[Aoi] = None,
+    ) -> Union[Cells, pd.DataFrame]:
+        """Index the raster one block at a time.
+
+        Peak memory is bounded by a single block plus the set of cells found so
+        far, regardless of the raster size. Throughput and peak RSS of the run
+        are recorded in `self.stats`.
+        """
+        # values are grouped over disjoint blocks so no pixel is counted twice
+        pad = 0 if agg else WINDOW_PAD_PIXELS
+        windows = self.block_windows(block_shape, pad)
+        if aoi is not None:
+            windows = self.clip_windows(windows, self.aoi_window(aoi))
+        windows = list(windows)
+        start = time.perf_counter()
+        cells = self.index_windows(
+            windows, workers, checkpoint, values=bool(agg), aoi=aoi
+        )
+        blocks = len(windows)
+        seconds = time.perf_counter() - start
+        self.stats = {
+            "blocks": blocks,
+            "seconds": seconds,
+            "blocks_per_sec": blocks / seconds if seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        return self.finish(cells, as_, agg, aoi)
+
+    def finish(
+        self,
+        cells: Union[np.ndarray, CellAccumulator, ValueAccumulator],
+        as_: str,
+        agg: Optional[Sequence[str]] = None,
+        aoi: Optional[Aoi] = None,
+    ) -> Union[Cells, pd.DataFrame]:
+        """Format the collected cells, or aggregates with `agg`, keeping only
+        cells whose centroid is in `aoi`.
+        """
+        if agg:
+            frame = cells.to_frame(agg)
+            if aoi is not None:
+                frame = frame[self.inside_aoi(frame.h3_index.to_numpy(), aoi)]
+            return frame.assign(h3_index=format_cells(frame.h3_index.to_numpy(), as_))
+        if not isinstance(cells, np.ndarray):
+            cells = cells.to_numpy()
+        if aoi is not None:
+            cells = cells[self.inside_aoi(cells, aoi)]
+        return format_cells(cells, as_)
+
+    def h3index(
+        self,
+        window: Optional[Tuple[int, int]] = None,
+        stream: bool = False,
+        block_shape: Optional[Tuple[int, int]] = None,
+        workers: Optional[int] = None,
+        overlap: int = 0,
+        overviews: bool = False,
+        as_: str = "string",
+        checkpoint: Optional[File] = None,
+        agg: Optional[Sequence[str]] = None,
+        aoi: Optional[Aoi] = None,
+        adaptive: bool = False,
+    ) -> Union[Cells, pd.DataFrame]:
+        """Index the valid pixels of the raster.
+
+        With `agg`, a subset of "sum", "mean", "max" and "count", the pixel
+        values of the first selected band are also aggregated per cell in the
+        same pass and a frame with `h3_index` and one column per aggregate is
+        returned.
+
+        With `aoi`, an area of interest in EPSG:4326, only the window covering
+        it is read and only cells whose centroid lies inside it are kept.
+
+        With `adaptive` the raster, or the window covering `aoi`, is read at
+        once and its validity mask polygonized. Large valid areas are then
+        covered with coarse cells refined only along their boundary and the
+        cells are returned already compacted.
+        """
         # TODO: Improve default values of this
-        # TODO: compare perfomance difference between this and
-        # vectorizing the raster 1st using rasterio.features.shapes
+        if agg:
+            self.check_agg(agg)
+            if overviews:
+                raise ValueError("agg cannot be computed from overviews")
+        full = Window(0, 0, self.src.width, self.src.height)
+        region = full if aoi is None else self.aoi_window(aoi)
+        if adaptive:
+            if agg or overviews or stream or block_shape or window is not None:
+                raise ValueError(
+                    "adaptive cannot be combined with agg, overviews or windows"
+                )
+            if self.transformer is not None:
+                raise ValueError('adaptive does not support reproject="centroids"')
+            cells = (
+                self.h3index_adaptive(region, aoi)
+                if region is not None
+                else np.empty(0, dtype=np.uint64)
+            )
+            return format_cells(cells, as_)
+        if overviews:
+            if stream or block_shape is not None or window is not None or overlap:
+                raise ValueError(
+                    "overviews cannot be combined with stream, block_shape, "
+                    "window or overlap"
+                )
+            if checkpoint is not None or workers is not None:
+                raise ValueError(
+                    "overviews are read in a single pass, without checkpoint or workers"
+                )
+            cells = (
+                self.h3index_overviews(region=region)
+                if region is not None
+                else np.empty(0, dtype=np.uint64)
+            )
+            return self.finish(cells, as_, aoi=aoi)
+        if stream or block_shape is not None:
+            return self.h3index_stream(block_shape, workers, as_, checkpoint, agg, aoi)
         if window is None:
-            h3_df = raster_to_dataframe(
-                self.src.read(1),
-                self.src.transform,
-                self.get_resolution(),
-                nodata_value=self.src.nodata,
-                compact=False,
+            windows = self.block_windows(
+                DEFAULT_BLOCK_SHAPE, pad=0 if agg else WINDOW_PAD_PIXELS
             )
-            return cells_to_string(h3_df.cell.unique()).tolist()
+        elif agg:
+            windows = self.block_windows(self.plan_block_shape(window), pad=0)
         else:
-            [left, bottom, right, top] = self.src.bounds
-            x_range, x_step = np.linspace(left, right, window[0], retstep=True)
-            y_range, y_step = np.linspace(bottom, top, window[1], retstep=True)
-            h3ids = []
-            for x in x_range:
-                for y in y_range:
-                    rio_window = self.src.window(x, y, x + x_step, y + y_step)
-                    win_transform = self.src.window_transform(rio_window)
-                    window = self.src.read(1, window=rio_window)
-                    nodata = (
-                        np.array(self.src.nodata, dtype=window.dtype)
-                        if self.src.nodata is not None
-                        else self.src.nodata
-                    )
-                    h3_df = raster_to_dataframe(
-                        window,
-                        win_transform,
-                        self.get_resolution(),
-                        nodata_value=nodata,
-                        compact=False,
-                    )
-                    h3ids.append(cells_to_string(h3_df.cell).tolist())
-            return np.unique(np.concatenate(h3ids, axis=None))
+            windows = self.plan_windows(window, overlap)
+        if aoi is not None:
+            windows = self.clip_windows(windows, region)
+        cells = self.index_windows(
+            windows, workers, checkpoint, values=bool(agg), aoi=aoi
+        )
+        return self.finish(cells, as_, agg, aoi)
+
+    def check_agg(self, agg: Sequence[str]) -> None:
+        unknown = set(agg) - set(AGGREGATIONS)
+        if unknown:
+            raise ValueError(f"agg must be a subset of {AGGREGATIONS}, got {agg!r}")
+        if len(self.bands) != 1:
+            raise ValueError("agg requires a single band")
 
     @property
     def bbox(self) -> Tuple[float, float, float, float]:
+        if self.transformer is not None:
+            return transform_bounds(self.src.crs, "EPSG:4326", *self.src.bounds)
         return tuple(self.src.bounds)
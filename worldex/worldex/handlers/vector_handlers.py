@@ -1,60 +1,238 @@
+import json
+import math
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Iterator, Optional, Sequence, Tuple, Union
 
 import geopandas as gpd
+import h3
+import numpy as np
 import pandas as pd
-from h3ronpy.arrow import cells_to_string
-from h3ronpy.arrow.vector import wkb_to_cells
-from shapely import Geometry, wkb
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import pyproj
+import shapely
+from h3ronpy.arrow import grid_disk
+from h3ronpy.arrow.vector import cells_to_wkb_polygons
+from shapely import Geometry
 
-from ..types import File
-from .base import BaseHandler
+from ..types import Aoi, Cells, File
+from ..utils.archive import is_vsi
+from ..utils.cells import (
+    CellAccumulator,
+    compact_cells,
+    format_cells,
+    points_to_cells,
+    polyfill_wkb,
+)
+from ..utils.cover import hierarchical_cover
+from .base import METERS_PER_DEGREE, BaseHandler, aoi_geometry, map_unordered
+
+try:
+    import pyogrio
+    from pyogrio.errors import DataLayerError, DataSourceError
+except ImportError:  # pyogrio is optional, files are then read with geopandas
+    pyogrio = None
 
 # Possible column names for a csv file
 POSSIBLE_X = ["x", "lon", "lng", "longitude"]
 POSSIBLE_Y = ["y", "lat", "latitude"]
 POSSIBLE_GEOM = ["geometry", "geo", "geom", "geography", "wkt", "wkb", "ewkb", "json"]
 
+# bytes of csv parsed per batch by `CsvHandler`
+CSV_BLOCK_SIZE = 64 * 1024**2
+
+WGS84 = pyproj.CRS("EPSG:4326")
+
+# geometries in another crs are reprojected to EPSG:4326 this many at a time
+REPROJECT_CHUNK_SIZE = 100_000
+
+# WKB type codes of plain 2D polygons and multipolygons, which h3ronpy can
+# polyfill without the geometries ever being decoded
+POLYGON_WKB_TYPES = [3, 6]
+
+
+LINE_TYPE_IDS = [shapely.GeometryType.LINESTRING, shapely.GeometryType.MULTILINESTRING]
+POINT_TYPE_IDS = [shapely.GeometryType.POINT, shapely.GeometryType.MULTIPOINT]
+
+
+def drop_z(geoms: np.ndarray) -> np.ndarray:
+    geoms = np.array(geoms, dtype=object)
+    has_z = shapely.has_z(geoms)
+    if has_z.any():
+        geoms[has_z] = shapely.force_2d(geoms[has_z])
+    return geoms
+
+
+def is_line(geoms: np.ndarray) -> np.ndarray:
+    return np.isin(shapely.get_type_id(geoms), LINE_TYPE_IDS)
+
+
+def is_point(geoms: np.ndarray) -> np.ndarray:
+    return np.isin(shapely.get_type_id(geoms), POINT_TYPE_IDS)
+
 
-BUFFER_SIZE = 0.0000000001
+def is_wgs84(crs) -> bool:
+    """Whether `crs` is lon/lat on WGS 84, in either axis order"""
+    return pyproj.CRS.from_user_input(crs).equals(WGS84, ignore_axis_order=True)
 
 
-def process_geometry(geom: Geometry) -> Geometry:
-    # drop z axis
-    if geom.has_z:
-        geom = wkb.loads(wkb.dumps(geom, output_dimension=2))
-    if geom.geom_type in ["MultiLineString", "LineString"]:
-        return geom.buffer(BUFFER_SIZE)
+def wkb_types(wkb: pa.Array) -> np.ndarray:
+    """Geometry type codes read from the headers of a non null WKB array.
+
+    Codes are returned as stored, ISO dimension offsets and EWKB flags
+    included, so only plain 2D geometries match their base code.
+    """
+    if len(wkb) == 0:
+        return np.empty(0, dtype=np.uint32)
+    _, offsets, data = wkb.buffers()
+    offset_type = np.int64 if pa.types.is_large_binary(wkb.type) else np.int32
+    offsets = np.frombuffer(offsets, dtype=offset_type)[
+        wkb.offset : wkb.offset + len(wkb)
+    ]
+    data = np.frombuffer(data, dtype=np.uint8)
+    header = data[offsets[:, None] + np.arange(5)]
+    codes = np.ascontiguousarray(header[:, 1:])
+    return np.where(
+        header[:, 0] == 1,
+        codes.view("<u4")[:, 0],
+        codes.view(">u4")[:, 0],
+    )
+
+
+def best_match(columns, possible: list[str]) -> Optional[str]:
+    """First column whose lowercase name is one of the `possible` names"""
+    return next((col for col in columns if str(col).lower() in possible), None)
+
+
+def lines_to_cells(lines: np.ndarray, resolution: int) -> np.ndarray:
+    """Unique cells as uint64 crossed by 2D lines.
+
+    Lines are densified to a quarter of the H3 edge length and the cells of
+    the sampled points, with their neighbours, are candidates. Any cell the
+    line passes through lies within one ring of a sample, so keeping the
+    candidates whose boundary intersects a line yields every crossed cell.
+    """
+    if len(lines) == 0:
+        return np.empty(0, dtype=np.uint64)
+    step = h3.edge_length(resolution, "m") / METERS_PER_DEGREE / 4
+    points = shapely.get_coordinates(shapely.segmentize(lines, step))
+    samples = polyfill_wkb(
+        [shapely.to_wkb(shapely.multipoints(points))], resolution, "intersects"
+    ).unique()
+    candidates = grid_disk(samples, 1, flatten=True).unique()
+    polygons = shapely.from_wkb(np.asarray(cells_to_wkb_polygons(candidates)))
+    crossed = np.unique(
+        shapely.STRtree(lines).query(polygons, predicate="intersects")[0]
+    )
+    return candidates.to_numpy(zero_copy_only=False)[crossed]
+
+
+def geometries_to_cells(
+    geoms: Sequence[Geometry],
+    resolution: int,
+    aoi: Optional[Aoi] = None,
+    adaptive: bool = False,
+) -> np.ndarray:
+    """Unique cells as uint64 covering non null geometries, or only their
+    parts inside `aoi`.
+
+    A GeoSeries in another crs is first reprojected to EPSG:4326. Lines take
+    `lines_to_cells` instead of being polyfilled as thin buffers, and points
+    skip WKB encoding through `points_to_cells`. With `adaptive` polygons
+    get a `hierarchical_cover` and the cells are returned compacted.
+    """
+    if isinstance(geoms, gpd.GeoSeries) and geoms.crs is not None:
+        if not is_wgs84(geoms.crs):
+            geoms = geoms.to_crs(epsg=4326)
+    geoms = drop_z(np.asarray(geoms))
+    if aoi is not None:
+        geoms = shapely.intersection(geoms, aoi_geometry(aoi))
+    lines = is_line(geoms)
+    points = is_point(geoms)
+    others = ~(lines | points)
+    if adaptive:
+        cells = hierarchical_cover(geoms[others], resolution, "intersects")
     else:
-        return geom
+        cells = polyfill_wkb(
+            shapely.to_wkb(geoms[others]), resolution, "intersects"
+        ).to_numpy(zero_copy_only=False)
+    coords = shapely.get_coordinates(geoms[points])
+    cells = np.concatenate(
+        [
+            cells,
+            lines_to_cells(geoms[lines], resolution),
+            points_to_cells(coords[:, 0], coords[:, 1], resolution),
+        ]
+    )
+    return compact_cells(cells) if adaptive else np.unique(cells)
+
+
+def clip_geometries(geoms: np.ndarray, aoi: Aoi) -> np.ndarray:
+    """Parts of the geometries inside the area of interest, non intersecting
+    geometries are dropped through an STRtree query first.
+    """
+    aoi = aoi_geometry(aoi)
+    geoms = np.asarray(geoms)
+    hits = np.sort(shapely.STRtree(geoms).query(aoi, predicate="intersects"))
+    return shapely.intersection(geoms[hits], aoi)
 
 
 class VectorHandler(BaseHandler):
     def __init__(self, gdf: gpd.GeoDataFrame, resolution: Optional[int] = None) -> None:
-        # h3 indexes are standardized to use epsg:4326 projection
-        if gdf.crs is None:
-            # TODO: add warnging if no crs exists
-            self.gdf = gdf.set_crs(epsg=4326)
-        else:
-            self.gdf = gdf.to_crs(epsg=4326)
+        # h3 indexes are standardized to use epsg:4326 projection. The frame
+        # is kept as is, without a copy, and geometries in any crs other than
+        # a variant of WGS 84 are reprojected chunk by chunk while indexing
+        # TODO: add warnging if no crs exists
+        self.gdf = gdf
+        self.reproject = gdf.crs is not None and not is_wgs84(gdf.crs)
         self.resolution = resolution
 
     @classmethod
     def from_file(cls, file: File, resolution: Optional[int] = None):
-        if isinstance(file, str):
+        # GDAL virtual paths, like archive members, must stay strings
+        if isinstance(file, str) and not is_vsi(file):
             file = Path(file)
-        try:
-            if file.suffix == ".csv":
-                return cls.from_csv(file, resolution)
-        except AttributeError:
-            pass
-        finally:
-            gdf = gpd.read_file(file)
-            return cls(gdf, resolution)
+        if isinstance(file, Path) and file.suffix == ".csv":
+            return cls.from_csv(file, resolution)
+        if isinstance(file, Path) and file.suffix in (".parquet", ".geoparquet"):
+            return cls.from_geoparquet(file, resolution)
+        if pyogrio is not None:
+            handler = WkbHandler.from_ogr(file, resolution)
+            if handler is not None:
+                return handler
+        gdf = gpd.read_file(file)
+        return cls(gdf, resolution)
+
+    @classmethod
+    def from_geoparquet(cls, file: File, resolution: Optional[int] = None):
+        """Read only the primary geometry column of a GeoParquet file.
+
+        WKB in EPSG:4326 is indexed as is by a `WkbHandler`, other files are
+        read with geopandas to be reprojected.
+        """
+        geo = json.loads(pq.read_schema(file).metadata[b"geo"])
+        column = geo["primary_column"]
+        meta = geo["columns"][column]
+        # a missing crs means OGC:CRS84
+        crs = meta.get("crs", "OGC:CRS84")
+        if meta["encoding"] == "WKB" and (crs is None or is_wgs84(crs)):
+            wkb = pq.read_table(file, columns=[column]).column(column)
+            return WkbHandler(wkb, resolution, meta.get("bbox"))
+        return cls(gpd.read_parquet(file, columns=[column]), resolution)
 
     @classmethod
     def from_csv(cls, file: File, resolution: Optional[int] = None):
-        """CSVs are a special case"""
+        """CSVs are a special case.
+
+        CSVs with coordinate columns named after `POSSIBLE_X` and `POSSIBLE_Y`
+        or a geometry column named after `POSSIBLE_GEOM` are streamed in
+        batches by a `CsvHandler`, other CSVs go through GDAL.
+        """
+        try:
+            return CsvHandler(file, resolution)
+        except ValueError:
+            pass
         possible_x = ",".join(POSSIBLE_X)
         possible_y = ",".join(POSSIBLE_Y)
         possible_geometry = ",".join(POSSIBLE_GEOM)
@@ -71,47 +249,409 @@ class VectorHandler(BaseHandler):
     @classmethod
     def from_excel(cls, file: File, resolution: Optional[int] = None):
         df = pd.read_excel(file)
-        x_best_match = next(
-            (col for col in df.columns if col.lower() in POSSIBLE_X), None
-        )
-        y_best_match = next(
-            (col for col in df.columns if col.lower() in POSSIBLE_Y), None
-        )
+        x_best_match = best_match(df.columns, POSSIBLE_X)
+        y_best_match = best_match(df.columns, POSSIBLE_Y)
         if x_best_match and y_best_match:
-            gdf = gpd.GeoDataFrame(
-                geometry=gpd.GeoSeries.from_xy(df[x_best_match], df[y_best_match]),
-                crs="EPSG:4326",
-            )
-            return cls(gdf, resolution)
-        geom_best_match = next(
-            (col for col in df.columns if col.lower() in POSSIBLE_GEOM), None
-        )
+            return PointHandler(df[x_best_match], df[y_best_match], resolution)
+        geom_best_match = best_match(df.columns, POSSIBLE_GEOM)
         if geom_best_match:
-            gpd.GeoDataFrame(
+            gdf = gpd.GeoDataFrame(
                 geometry=gpd.GeoSeries.from_wkt(df[geom_best_match]), crs="EPSG:4326"
             )
             return cls(gdf, resolution)
         raise ValueError("Cannot convert excel file to geopandas")
 
-    def get_resolution(self) -> int:
-        if self.resolution is None:
-            return self.default_resolution
-        return self.resolution
+    def geometries(self, aoi: Optional[Aoi] = None) -> gpd.GeoSeries:
+        """Non null geometries, or only those intersecting an area of interest.
+
+        Features outside `aoi` are dropped with a spatial index query before
+        anything else is done with them.
+        """
+        if aoi is None:
+            return self.gdf.geometry[~self.gdf.geometry.isnull()]
+        aoi = aoi_geometry(aoi)
+        if self.reproject:
+            # query the index in the crs of the data, densified to follow the projection
+            minx, miny, maxx, maxy = aoi.bounds
+            aoi = shapely.segmentize(aoi, max(maxx - minx, maxy - miny) / 16)
+            aoi = gpd.GeoSeries([aoi], crs=WGS84).to_crs(self.gdf.crs).iloc[0]
+        hits = np.sort(self.gdf.sindex.query(aoi, predicate="intersects"))
+        return self.gdf.geometry.iloc[hits]
+
+    def chunks(self, geom: gpd.GeoSeries, chunk_size: int) -> Iterator[gpd.GeoSeries]:
+        """Split geometries into chunks of `chunk_size` rows"""
+        for start in range(0, len(geom), chunk_size):
+            yield geom.iloc[start : start + chunk_size]
+
+    def map_chunks(
+        self,
+        geom: gpd.GeoSeries,
+        chunk_size: int,
+        workers: Optional[int] = None,
+        aoi: Optional[Aoi] = None,
+        adaptive: bool = False,
+    ) -> Iterator[np.ndarray]:
+        """Yield the unique cells of each chunk, in completion order.
 
-    def h3index(self) -> List[int]:
+        With `workers` > 1 the chunks are fanned out to a process pool, every
+        worker reprojecting, clipping, buffering, encoding and converting its
+        own chunk.
+        """
+        yield from map_unordered(
+            geometries_to_cells,
+            self.chunks(geom, chunk_size),
+            workers,
+            self.get_resolution(),
+            aoi,
+            adaptive,
+        )
+
+    def h3index(
+        self,
+        as_: str = "string",
+        chunk_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        aoi: Optional[Aoi] = None,
+        adaptive: bool = False,
+    ) -> Cells:
+        """Index all geometries, or with `aoi` only their parts inside that
+        area of interest in EPSG:4326.
+
+        With `adaptive` the cells are returned already compacted, large
+        polygons are covered with coarse cells refined only along their
+        boundary instead of listing every cell of the resolution.
+
+        With `chunk_size` and/or `workers` the geometries are indexed in
+        chunks of `chunk_size` rows, by default split evenly over the workers,
+        and the cells of all chunks merged with a unique over uint64. Frames
+        in another crs are always reprojected in chunks of at most
+        `REPROJECT_CHUNK_SIZE` rows, never as a whole.
+        """
         # TODO: Measure perfomance differences of using self.gdf.geometry.unary_union.to_wkb() for large files
-        # TODO: Measure perfomance degradation of using process_geometry/ geom.buffer for large files
-        geom = self.gdf.geometry[~self.gdf.geometry.isnull()]
-        cells = cells_to_string(
-            wkb_to_cells(
-                geom.apply(process_geometry).to_wkb(),
-                resolution=self.get_resolution(),
+        geom = self.geometries(aoi)
+        single = workers is None or workers <= 1
+        if chunk_size is None and single and not self.reproject:
+            return format_cells(
+                geometries_to_cells(geom, self.get_resolution(), aoi, adaptive), as_
+            )
+        if chunk_size is None:
+            chunk_size = (
+                REPROJECT_CHUNK_SIZE
+                if single
+                else max(1, math.ceil(len(geom) / workers))
             )
-            .flatten()
-            .unique()
-        ).to_pylist()
-        return cells
+            if self.reproject:
+                chunk_size = min(chunk_size, REPROJECT_CHUNK_SIZE)
+        cells = CellAccumulator()
+        for chunk_cells in self.map_chunks(geom, chunk_size, workers, aoi, adaptive):
+            cells.add(chunk_cells)
+        if adaptive:
+            return format_cells(compact_cells(cells.to_numpy()), as_)
+        return format_cells(cells.to_numpy(), as_)
 
     @property
     def bbox(self) -> Tuple[float, float, float, float]:
+        if self.reproject:
+            transformer = pyproj.Transformer.from_crs(
+                self.gdf.crs, WGS84, always_xy=True
+            )
+            return transformer.transform_bounds(*self.gdf.total_bounds)
         return tuple(self.gdf.total_bounds)
+
+
+class PointHandler(BaseHandler):
+    """Index lon/lat coordinate arrays in EPSG:4326 without building geometries.
+
+    Usage:
+
+    >>> handler = PointHandler(df.lon, df.lat)
+    >>> handler.h3index()
+    """
+
+    def __init__(self, x, y, resolution: Optional[int] = None) -> None:
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.resolution = resolution
+
+    def h3index(
+        self,
+        as_: str = "string",
+        chunk_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        aoi: Optional[Aoi] = None,
+        adaptive: bool = False,
+    ) -> Cells:
+        """Index all points, or with `aoi` only those inside it, compacting
+        the cells with `adaptive`. Points are converted in a single pass, on
+        h3ronpy's own threads, `chunk_size` and `workers` are accepted like
+        on the other handlers and ignored.
+        """
+        x, y = self.x, self.y
+        if aoi is not None:
+            inside = shapely.intersects_xy(aoi_geometry(aoi), x, y)
+            x, y = x[inside], y[inside]
+        cells = points_to_cells(x, y, self.get_resolution())
+        return format_cells(compact_cells(cells) if adaptive else cells, as_)
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        return (
+            np.nanmin(self.x),
+            np.nanmin(self.y),
+            np.nanmax(self.x),
+            np.nanmax(self.y),
+        )
+
+
+class CsvHandler(BaseHandler):
+    """Index a CSV in EPSG:4326 one batch of rows at a time.
+
+    Coordinate (`POSSIBLE_X`/`POSSIBLE_Y`) or geometry (`POSSIBLE_GEOM`)
+    columns are detected once from the header, only those columns are parsed,
+    and the cells of each batch are folded into a running unique set. Peak
+    memory is bounded by `block_size` bytes of csv plus the cells found so far.
+    Geometry columns may hold WKT, hex encoded WKB or GeoJSON.
+
+    Usage:
+
+    >>> handler = CsvHandler("facilities.csv")
+    >>> handler.h3index()
+    """
+
+    def __init__(
+        self,
+        file: File,
+        resolution: Optional[int] = None,
+        block_size: int = CSV_BLOCK_SIZE,
+    ) -> None:
+        self.file = file
+        self.resolution = resolution
+        self.block_size = block_size
+        columns = pd.read_csv(file, nrows=0).columns
+        self.x = best_match(columns, POSSIBLE_X)
+        self.y = best_match(columns, POSSIBLE_Y)
+        self.geometry = best_match(columns, POSSIBLE_GEOM)
+        if not (self.x and self.y) and not self.geometry:
+            raise ValueError(f"Cannot find coordinate or geometry columns in {file}")
+        self._bounds: Optional[Tuple[float, float, float, float]] = None
+        self.stats: dict = {}
+
+    def batches(self) -> Iterator[pa.RecordBatch]:
+        """Stream the detected columns of the csv as strings, empty cells as
+        nulls
+        """
+        columns = [self.x, self.y] if self.x and self.y else [self.geometry]
+        reader = pa_csv.open_csv(
+            self.file,
+            read_options=pa_csv.ReadOptions(block_size=self.block_size),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={column: pa.string() for column in columns},
+                strings_can_be_null=True,
+            ),
+        )
+        yield from reader
+
+    def batch_coordinates(self, batch: pa.RecordBatch) -> Tuple[np.ndarray, np.ndarray]:
+        """Coordinates of a batch, NaN where a value is not a number"""
+        return tuple(
+            pd.to_numeric(
+                batch.column(column).to_numpy(zero_copy_only=False), errors="coerce"
+            ).astype(np.float64)
+            for column in (self.x, self.y)
+        )
+
+    def batch_geometries(self, batch: pa.RecordBatch) -> np.ndarray:
+        """Geometries of a batch, rows with a missing or malformed geometry
+        are skipped like the null geometries GDAL's CSV driver gives them
+        """
+        values = batch.column(self.geometry).to_numpy(zero_copy_only=False)
+        values = values[pd.notna(values)]
+        values = values[np.char.str_len(np.char.strip(values.astype(str))) > 0]
+        if len(values) == 0:
+            return np.empty(0, dtype=object)
+        sample = values[0].strip()
+        if sample.startswith("{"):
+            geoms = shapely.from_geojson(values, on_invalid="ignore")
+        else:
+            try:
+                bytes.fromhex(sample)
+            except ValueError:
+                geoms = shapely.from_wkt(values, on_invalid="ignore")
+            else:
+                geoms = shapely.from_wkb(values, on_invalid="ignore")
+        return geoms[~shapely.is_missing(geoms)]
+
+    def h3index(
+        self,
+        as_: str = "string",
+        chunk_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        aoi: Optional[Aoi] = None,
+        adaptive: bool = False,
+    ) -> Cells:
+        """Index all rows of the csv, or with `aoi` only what lies inside it.
+        With `adaptive` the cells are returned compacted, see
+        `VectorHandler.h3index`. Batches of `block_size` bytes are read and
+        indexed on a single process, `chunk_size` and `workers` are accepted
+        like on the other handlers and ignored.
+        """
+        cells = CellAccumulator()
+        bounds = []
+        rows = batches = 0
+        for batch in self.batches():
+            if self.x and self.y:
+                x, y = self.batch_coordinates(batch)
+                if aoi is not None:
+                    inside = shapely.intersects_xy(aoi_geometry(aoi), x, y)
+                    x, y = x[inside], y[inside]
+                cells.add(points_to_cells(x, y, self.get_resolution()))
+                if np.isfinite(x).any() and np.isfinite(y).any():
+                    bounds.append(
+                        (np.nanmin(x), np.nanmin(y), np.nanmax(x), np.nanmax(y))
+                    )
+            else:
+                geoms = self.batch_geometries(batch)
+                if aoi is not None:
+                    geoms = clip_geometries(geoms, aoi)
+                cells.add(
+                    geometries_to_cells(geoms, self.get_resolution(), adaptive=adaptive)
+                )
+                if len(geoms):
+                    bounds.append(tuple(shapely.total_bounds(geoms)))
+            rows += batch.num_rows
+            batches += 1
+        if bounds:
+            bounds = np.array(bounds)
+            self._bounds = (
+                bounds[:, 0].min(),
+                bounds[:, 1].min(),
+                bounds[:, 2].max(),
+                bounds[:, 3].max(),
+            )
+        self.stats = {"rows": rows, "batches": batches}
+        if adaptive:
+            return format_cells(compact_cells(cells.to_numpy()), as_)
+        return format_cells(cells.to_numpy(), as_)
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        if self._bounds is None:
+            # bounds are collected while indexing
+            self.h3index(as_="uint64")
+        return self._bounds
+
+
+def wkb_to_h3(
+    wkb: pa.Array, resolution: int, aoi: Optional[Aoi] = None, adaptive: bool = False
+) -> np.ndarray:
+    """Unique cells as uint64 of WKB geometries in EPSG:4326, compacted with
+    `adaptive`.
+
+    Plain 2D polygons and multipolygons go to h3ronpy without being decoded,
+    `aoi` and `adaptive` decode every geometry.
+    """
+    if aoi is not None or adaptive:
+        geoms = shapely.from_wkb(np.asarray(wkb))
+        if aoi is not None:
+            geoms = clip_geometries(geoms, aoi)
+        return geometries_to_cells(geoms, resolution, adaptive=adaptive)
+    polygons = np.isin(wkb_types(wkb), POLYGON_WKB_TYPES)
+    cells = polyfill_wkb(
+        wkb.filter(pa.array(polygons)), resolution, "intersects"
+    ).to_numpy(zero_copy_only=False)
+    others = shapely.from_wkb(np.asarray(wkb.filter(pa.array(~polygons))))
+    return np.unique(np.concatenate([cells, geometries_to_cells(others, resolution)]))
+
+
+class WkbHandler(BaseHandler):
+    """Index WKB geometries in EPSG:4326 held in an arrow array.
+
+    Plain 2D polygons and multipolygons, identified from their WKB headers,
+    are passed to h3ronpy without being decoded. Only the remaining
+    geometries are decoded by shapely to take the line and point paths of
+    `geometries_to_cells`.
+
+    Usage:
+
+    >>> handler = WkbHandler.from_ogr("buildings.gpkg")
+    >>> handler.h3index()
+    """
+
+    def __init__(
+        self,
+        wkb: Union[pa.Array, pa.ChunkedArray],
+        resolution: Optional[int] = None,
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+    ) -> None:
+        if isinstance(wkb, pa.ChunkedArray):
+            wkb = wkb.combine_chunks()
+        self.wkb = wkb.filter(wkb.is_valid())
+        self.resolution = resolution
+        self._bounds = tuple(bounds) if bounds is not None else None
+
+    @classmethod
+    def from_ogr(cls, file: File, resolution: Optional[int] = None):
+        """Read only the geometry column with pyogrio, as WKB.
+
+        Returns None when the layer has no geometry, is not in EPSG:4326 or
+        cannot be opened by pyogrio, so the caller can fall back to geopandas.
+        """
+        try:
+            meta, table = pyogrio.raw.read_arrow(str(file), columns=[])
+        except (DataSourceError, DataLayerError):
+            return None
+        column = meta["geometry_name"] or "wkb_geometry"
+        if column not in table.column_names:
+            return None
+        if meta["crs"] is not None and not is_wgs84(meta["crs"]):
+            return None
+        info = pyogrio.read_info(str(file))
+        return cls(table.column(column), resolution, info["total_bounds"])
+
+    def chunks(self, chunk_size: int) -> Iterator[pa.Array]:
+        """Split the geometries into compact arrays of `chunk_size` rows"""
+        for start in range(0, len(self.wkb), chunk_size):
+            yield pa.concat_arrays([self.wkb.slice(start, chunk_size)])
+
+    def h3index(
+        self,
+        as_: str = "string",
+        chunk_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        aoi: Optional[Aoi] = None,
+        adaptive: bool = False,
+    ) -> Cells:
+        """Index all geometries, or with `aoi` only their parts inside it.
+        Both `aoi` and `adaptive`, see `VectorHandler.h3index`, require
+        decoding the geometries.
+
+        With `chunk_size` and/or `workers` the geometries are indexed in
+        chunks of `chunk_size` rows, by default split evenly over the
+        workers, like `VectorHandler.h3index`.
+        """
+        if chunk_size is None and (workers is None or workers <= 1):
+            return format_cells(
+                wkb_to_h3(self.wkb, self.get_resolution(), aoi, adaptive), as_
+            )
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(self.wkb) / workers))
+        cells = CellAccumulator()
+        for chunk_cells in map_unordered(
+            wkb_to_h3,
+            self.chunks(chunk_size),
+            workers,
+            self.get_resolution(),
+            aoi,
+            adaptive,
+        ):
+            cells.add(chunk_cells)
+        if adaptive:
+            return format_cells(compact_cells(cells.to_numpy()), as_)
+        return format_cells(cells.to_numpy(), as_)
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        if self._bounds is None:
+            self._bounds = tuple(shapely.total_bounds(shapely.from_wkb(self.wkb)))
+        return self._bounds
@@ -1,4 +1,14 @@
 import os
 import typing
 
+import numpy as np
+import pyarrow as pa
+from shapely import Geometry
+
 File = typing.Union[str, os.PathLike]
+
+# h3 cells as returned by the handlers, see `worldex.utils.cells.format_cells`
+Cells = typing.Union[typing.List[str], np.ndarray, pa.Array]
+
+# area of interest in EPSG:4326, a geometry or (minx, miny, maxx, maxy) bounds
+Aoi = typing.Union[Geometry, typing.Tuple[float, float, float, float]]
@@ -0,0 +1,152 @@
+"""Access to archive members without extracting the whole archive
+"""
+
+import fnmatch
+import tarfile
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+from pyunpack import Archive as Unpacker
+
+from ..types import File
+
+# archives GDAL reads in place, by lowercase suffix
+VSI_PREFIXES = {
+    ".zip": "/vsizip/",
+    ".tar": "/vsitar/",
+    ".tgz": "/vsitar/",
+    ".tar.gz": "/vsitar/",
+}
+# archives that are extracted once instead, GDAL reads 7z in place only from 3.7
+EXTRACT_SUFFIXES = (".7z", ".rar")
+ARCHIVE_SUFFIXES = (*VSI_PREFIXES, *EXTRACT_SUFFIXES)
+
+# written into an extraction directory once every member is extracted
+EXTRACTED = ".extracted"
+
+
+def archive_suffix(name: str) -> Optional[str]:
+    name = name.lower()
+    return next((s for s in ARCHIVE_SUFFIXES if name.endswith(s)), None)
+
+
+def is_archive(name: File) -> bool:
+    return archive_suffix(str(name)) is not None
+
+
+def is_vsi(path: File) -> bool:
+    """Whether `path` is a GDAL virtual file system path"""
+    return str(path).startswith("/vsi")
+
+
+def vsi_path(archive: str, member: str = "") -> str:
+    """GDAL virtual path of a member of an archive, or of the archive itself
+    when it is a member of another archive.
+    """
+    prefix = VSI_PREFIXES[archive_suffix(archive)]
+    if is_vsi(archive):
+        archive = "{" + archive + "}"
+    return f"{prefix}{archive}/{member}" if member else f"{prefix}{archive}"
+
+
+def local_path(path: File) -> str:
+    """Local file behind a GDAL virtual path, the outermost archive"""
+    path = str(path)
+    while is_vsi(path):
+        path = path[path.index("/", 1) + 1 :]
+        if path.startswith("{"):
+            path = path[1 : path.rindex("}")]
+            continue
+        parts = PurePosixPath(path).parts
+        for i in range(1, len(parts) + 1):
+            if is_archive(parts[i - 1]):
+                return str(PurePosixPath(*parts[:i]))
+    return path
+
+
+class Archive:
+    """Members of a zip, tar, 7z or rar archive.
+
+    Zip and tar members are listed with the standard library and opened by
+    the handlers through GDAL's /vsizip/ and /vsitar/ paths, nothing is
+    written to disk, members that are archives themselves included. Archives
+    GDAL cannot read in place are extracted once next to the archive, and
+    skipped on later runs.
+
+    Usage:
+
+    >>> archive = Archive("data/population.zip")
+    >>> archive.find("*.tif")
+    ['/vsizip//abs/data/population.zip/pop.tif']
+    """
+
+    def __init__(self, path: File) -> None:
+        path = str(path)
+        if is_vsi(path) and path.endswith("}"):
+            # a nested archive opened as a dataset, as returned by member_path
+            path = path[path.index("{") + 1 : -1]
+        self.path = path if is_vsi(path) else str(Path(path).absolute())
+        self.suffix = archive_suffix(self.path)
+        if self.suffix is None:
+            raise ValueError(f"{path} is not a supported archive")
+
+    @property
+    def streamable(self) -> bool:
+        return self.suffix in VSI_PREFIXES
+
+    @property
+    def extract_dir(self) -> Path:
+        return Path(self.path[: -len(self.suffix)])
+
+    def members(self) -> list[str]:
+        """Relative paths of the files in the archive"""
+        if not self.streamable:
+            dir = self.extract()
+            return sorted(
+                str(p.relative_to(dir))
+                for p in dir.rglob("*")
+                if p.is_file() and p.name != EXTRACTED
+            )
+        if is_vsi(self.path):
+            # a nested archive, only GDAL can look inside
+            raise ValueError(f"cannot list members of nested archive {self.path}")
+        if self.suffix == ".zip":
+            with zipfile.ZipFile(self.path) as zf:
+                return [m.filename for m in zf.infolist() if not m.is_dir()]
+        with tarfile.open(self.path) as tf:
+            return [m.name for m in tf.getmembers() if m.isfile()]
+
+    def member_path(self, member: str) -> str:
+        """Path handlers can open a member with, members that are archives
+        themselves are returned as GDAL datasets.
+        """
+        if not self.streamable:
+            return str(self.extract_dir / member)
+        path = vsi_path(self.path, member)
+        if is_archive(member) and archive_suffix(member) in VSI_PREFIXES:
+            return vsi_path(path)
+        return path
+
+    def find(self, *patterns: str) -> list[str]:
+        """Paths of the members whose name matches any of the case
+        insensitive glob `patterns`, macOS resource forks excluded.
+        """
+        return [
+            self.member_path(member)
+            for member in self.members()
+            if "__MACOSX" not in member
+            and any(
+                fnmatch.fnmatch(PurePosixPath(member).name.lower(), p.lower())
+                for p in patterns
+            )
+        ]
+
+    def extract(self) -> Path:
+        """Extract the whole archive next to it, unless done before"""
+        dir = self.extract_dir
+        if not (dir / EXTRACTED).exists():
+            dir.mkdir(parents=True, exist_ok=True)
+            Unpacker(self.path).extractall(str(dir))
+            (dir / EXTRACTED).touch()
+        return dir
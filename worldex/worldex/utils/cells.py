@@ -0,0 +1,301 @@
+"""Helpers for collecting h3 cells produced by the handlers
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from h3ronpy import ContainmentMode
+from h3ronpy.arrow import (
+    cells_parse,
+    cells_resolution,
+    cells_to_string,
+    change_resolution,
+    compact,
+)
+from h3ronpy.arrow.vector import coordinates_to_cells, wkb_to_cells
+
+# h3ronpy's default containment mode changed between releases, so every
+# polyfill names its rule: cells whose boundary intersects a geometry, or
+# cells whose centroid lies in it
+CONTAINMENT_MODES = {
+    "intersects": ContainmentMode.IntersectsBoundary,
+    "centroid": ContainmentMode.ContainsCentroid,
+}
+
+
+def polyfill_wkb(wkb, resolution: int, containment: str) -> pa.Array:
+    """Flat array of the cells of WKB geometries under a `containment` rule"""
+    if containment not in CONTAINMENT_MODES:
+        raise ValueError(
+            f"containment must be one of {tuple(CONTAINMENT_MODES)}, "
+            f"got {containment!r}"
+        )
+    if not isinstance(wkb, pa.Array):
+        wkb = pa.array(wkb, type=pa.binary())
+    return wkb_to_cells(
+        wkb,
+        resolution=resolution,
+        containment_mode=CONTAINMENT_MODES[containment],
+        flatten=True,
+    )
+
+
+class CellAccumulator:
+    """Running, deduplicated set of h3 cells stored as uint64.
+
+    Incoming arrays are buffered and only merged once the buffer outgrows the
+    set itself, so repeated additions stay amortized linear instead of
+    re-sorting the whole set on every block.
+
+    Usage:
+
+    >>> cells = CellAccumulator()
+    >>> cells.add(block_cells)
+    >>> cells.to_numpy()
+    """
+
+    def __init__(self) -> None:
+        self._cells = np.empty(0, dtype=np.uint64)
+        self._pending: list[np.ndarray] = []
+        self._pending_size = 0
+
+    def add(self, cells) -> None:
+        cells = np.unique(np.asarray(cells, dtype=np.uint64))
+        if len(cells) == 0:
+            return
+        self._pending.append(cells)
+        self._pending_size += len(cells)
+        if self._pending_size > len(self._cells):
+            self._merge()
+
+    def _merge(self) -> None:
+        if self._pending:
+            self._cells = np.unique(np.concatenate([self._cells, *self._pending]))
+            self._pending = []
+            self._pending_size = 0
+
+    def to_numpy(self) -> np.ndarray:
+        self._merge()
+        return self._cells
+
+    def __len__(self) -> int:
+        self._merge()
+        return len(self._cells)
+
+
+AGGREGATIONS = ("sum", "mean", "max", "count")
+
+
+def group_values(cells, count, total, maximum) -> pd.DataFrame:
+    """Group partial aggregates by cell with a vectorized unique over uint64"""
+    cells, inverse = np.unique(np.asarray(cells, dtype=np.uint64), return_inverse=True)
+    grouped_max = np.full(len(cells), -np.inf)
+    np.maximum.at(grouped_max, inverse, maximum)
+    return pd.DataFrame(
+        {
+            "h3_index": cells,
+            "count": np.bincount(inverse, weights=count, minlength=len(cells)).astype(
+                np.int64
+            ),
+            "sum": np.bincount(inverse, weights=total, minlength=len(cells)),
+            "max": grouped_max,
+        }
+    )
+
+
+class ValueAccumulator:
+    """Running per-cell aggregates of pixel values.
+
+    Partial aggregates are frames with `h3_index`, `count`, `sum` and `max`
+    columns, cells with a `count` of 0 are covered without holding a value.
+    Like `CellAccumulator`, partials are buffered and only grouped once the
+    buffer outgrows the running result.
+
+    Usage:
+
+    >>> values = ValueAccumulator()
+    >>> values.add(window_values)
+    >>> values.to_frame(["sum", "mean"])
+    """
+
+    def __init__(self) -> None:
+        self._frame = group_values([], [], [], [])
+        self._pending: list[pd.DataFrame] = []
+        self._pending_size = 0
+
+    def add(self, frame: pd.DataFrame) -> None:
+        if len(frame) == 0:
+            return
+        self._pending.append(frame)
+        self._pending_size += len(frame)
+        if self._pending_size > len(self._frame):
+            self._merge()
+
+    def _merge(self) -> None:
+        if self._pending:
+            frame = pd.concat([self._frame, *self._pending])
+            self._frame = group_values(
+                frame.h3_index, frame["count"], frame["sum"], frame["max"]
+            )
+            self._pending = []
+            self._pending_size = 0
+
+    def to_frame(self, agg=AGGREGATIONS) -> pd.DataFrame:
+        """Cells as uint64 with the requested `agg` columns.
+
+        Cells without values get a `count` and `sum` of 0 and a NaN `mean`
+        and `max`.
+        """
+        self._merge()
+        frame = self._frame
+        empty = frame["count"].to_numpy() == 0
+        columns = {"h3_index": frame.h3_index.to_numpy()}
+        for name in agg:
+            if name == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    columns["mean"] = frame["sum"].to_numpy() / frame["count"]
+            elif name == "max":
+                columns["max"] = np.where(empty, np.nan, frame["max"])
+            else:
+                columns[name] = frame[name].to_numpy()
+        return pd.DataFrame(columns)
+
+    def __len__(self) -> int:
+        self._merge()
+        return len(self._frame)
+
+
+CELL_FORMATS = ("string", "uint64", "arrow")
+
+
+def format_cells(cells, as_: str = "string"):
+    """Convert uint64 cells to the representation requested from a handler.
+
+    - "string": list of hex strings (default)
+    - "uint64": numpy uint64 array
+    - "arrow": pyarrow UInt64Array
+    """
+    if as_ not in CELL_FORMATS:
+        raise ValueError(f"as_ must be one of {CELL_FORMATS}, got {as_!r}")
+    if isinstance(cells, (pa.Array, pa.ChunkedArray)):
+        array = cells.cast(pa.uint64())
+    else:
+        array = pa.array(np.asarray(cells, dtype=np.uint64), type=pa.uint64())
+    if as_ == "arrow":
+        return array
+    if as_ == "uint64":
+        return array.to_numpy(zero_copy_only=False)
+    return cells_to_string(array).to_pylist()
+
+
+def parse_cells(cells) -> np.ndarray:
+    """Convert cells in any handler representation back to a numpy uint64 array"""
+    if isinstance(cells, pd.Series):
+        cells = cells.to_numpy()
+    if isinstance(cells, (pa.Array, pa.ChunkedArray)):
+        if pa.types.is_integer(cells.type):
+            return cells.cast(pa.uint64()).to_numpy(zero_copy_only=False)
+        cells = cells.to_pylist()
+    cells = np.asarray(cells)
+    if np.issubdtype(cells.dtype, np.integer):
+        return cells.astype(np.uint64, copy=False)
+    return cells_parse(pa.array(cells, type=pa.string())).to_numpy(zero_copy_only=False)
+
+
+def resolutions(cells: np.ndarray) -> np.ndarray:
+    return cells_resolution(pa.array(cells, type=pa.uint64())).to_numpy(
+        zero_copy_only=False
+    )
+
+
+def drop_covered(cells: np.ndarray) -> np.ndarray:
+    """Drop cells whose ancestor is also in the set, as when covers overlap"""
+    cell_resolutions = resolutions(cells)
+    keep = np.ones(len(cells), dtype=bool)
+    for level in np.unique(cell_resolutions)[:-1]:
+        finer = cell_resolutions > level
+        parents = change_resolution(
+            pa.array(cells[finer], type=pa.uint64()), int(level)
+        ).to_numpy(zero_copy_only=False)
+        keep[finer] &= ~np.isin(
+            parents.astype(np.uint64), cells[cell_resolutions == level]
+        )
+    return cells[keep]
+
+
+def compact_cells(cells) -> np.ndarray:
+    """Compact cells as uint64 of a set of cells of mixed resolutions"""
+    cells = drop_covered(np.unique(np.asarray(cells, dtype=np.uint64)))
+    compacted = compact(pa.array(cells, type=pa.uint64()), mixed_resolutions=True)
+    return compacted.to_numpy(zero_copy_only=False).astype(np.uint64)
+
+
+def parent_cells(cells) -> dict[int, np.ndarray]:
+    """Distinct ancestors of cells of mixed resolutions at every coarser
+    resolution, as sorted uint64 arrays keyed by resolution.
+
+    Resolutions are walked from the finest up, so each parent level is
+    derived from the level below it instead of from every input cell.
+    """
+    cells = np.asarray(cells, dtype=np.uint64)
+    if len(cells) == 0:
+        return {}
+    cell_resolutions = resolutions(cells)
+    parents = {}
+    level = np.empty(0, dtype=np.uint64)
+    for resolution in range(int(cell_resolutions.max()) - 1, -1, -1):
+        children = np.concatenate([level, cells[cell_resolutions == resolution + 1]])
+        level = np.unique(
+            change_resolution(pa.array(children, type=pa.uint64()), resolution)
+            .to_numpy(zero_copy_only=False)
+            .astype(np.uint64)
+        )
+        parents[resolution] = level
+    return parents
+
+
+def multiresolution_cells(cells) -> pd.DataFrame:
+    """Compacted cells and the parents of every compacted cell in one frame.
+
+    Rows hold `h3_index` as uint64, its `resolution`, and
+    `children_indicator`, set for parents rather than compacted cells, sorted
+    by cell. The two sets never overlap since no compacted cell contains
+    another.
+    """
+    # cells may already be compacted, as produced with adaptive=True
+    compacted = compact_cells(cells)
+    parents = parent_cells(compacted)
+    frame = pd.DataFrame(
+        {
+            "h3_index": np.concatenate([compacted, *parents.values()]),
+            "resolution": np.concatenate(
+                [
+                    resolutions(compacted),
+                    *(np.full(len(level), r) for r, level in parents.items()),
+                ]
+            ).astype(np.uint8),
+            "children_indicator": np.arange(
+                len(compacted) + sum(map(len, parents.values()))
+            )
+            >= len(compacted),
+        }
+    )
+    return frame.sort_values("h3_index", ignore_index=True)
+
+
+def points_to_cells(x, y, resolution: int) -> np.ndarray:
+    """Unique cells as uint64 of lon/lat coordinate arrays.
+
+    No geometry objects are created, the coordinate arrays are converted by
+    h3ronpy's `coordinates_to_cells`. Rows with a missing coordinate are
+    skipped.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    if len(x) == 0:
+        return np.empty(0, dtype=np.uint64)
+    cells = coordinates_to_cells(y, x, resolution)
+    return cells.unique().to_numpy(zero_copy_only=False).astype(np.uint64)
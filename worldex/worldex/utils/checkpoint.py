@@ -0,0 +1,194 @@
+"""On-disk checkpoints for resumable windowed indexing
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from rasterio.windows import Window
+
+from ..types import File
+
+MANIFEST = "manifest.json"
+LOG = "windows.jsonl"
+
+# windows are buffered and written together once they hold this many cells,
+# or this many windows, whichever comes first
+SHARD_ROWS = 1_000_000
+SHARD_WINDOWS = 256
+
+
+def window_key(rio_window: Window) -> str:
+    return "{}-{}-{}-{}".format(
+        *map(
+            int,
+            (
+                rio_window.row_off,
+                rio_window.col_off,
+                rio_window.height,
+                rio_window.width,
+            ),
+        )
+    )
+
+
+def window_layout(windows: Iterable[Window]) -> str:
+    """Digest of the planned windows, padding included, in their order"""
+    digest = hashlib.sha256()
+    for rio_window in windows:
+        digest.update(window_key(rio_window).encode() + b"\n")
+    return digest.hexdigest()
+
+
+def replace_atomic(path: Path, write) -> None:
+    """Write to a temporary sibling of `path` and move it in place,
+    so an interrupted write never leaves a truncated file behind.
+    """
+    tmp = path.with_name(f".{path.name}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class WindowCheckpoint:
+    """Spill directory holding the cells of every completed window.
+
+    Completed windows are buffered and written together as one parquet
+    shard, which is then recorded as a single line of `windows.jsonl`, so a
+    window is only ever considered done once its shard is complete. The log
+    is only appended to and synced once per shard, a torn last line left by
+    a crash is dropped on resume. `manifest.json` stores a fingerprint of
+    the source, indexing options and window layout, see `window_layout`, a
+    rerun with a different input refuses to mix shards. Call `flush` once all windows are saved.
+
+    Usage:
+
+    >>> checkpoint = WindowCheckpoint("spill/", {"path": "raster.tif"})
+    >>> if not checkpoint.done(window):
+    >>>     checkpoint.save(window, cells)
+    >>> checkpoint.flush()
+    >>> merged = np.unique(np.concatenate(list(checkpoint.shards())))
+    """
+
+    def __init__(
+        self,
+        dir: File,
+        fingerprint: dict,
+        shard_rows: int = SHARD_ROWS,
+        shard_windows: int = SHARD_WINDOWS,
+    ) -> None:
+        self.dir = Path(dir)
+        self.dir.mkdir(exist_ok=True, parents=True)
+        self.shard_rows = shard_rows
+        self.shard_windows = shard_windows
+        # round trip through json so tuples and lists compare equal
+        self.fingerprint = json.loads(json.dumps(fingerprint))
+        manifest_path = self.dir / MANIFEST
+        if manifest_path.exists():
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest["fingerprint"] != self.fingerprint:
+                raise ValueError(
+                    f"Checkpoint in {self.dir} was created for a different input: "
+                    f"{manifest['fingerprint']}, remove it to start over"
+                )
+        else:
+            manifest = {"fingerprint": self.fingerprint}
+
+            def write(path):
+                with open(path, "w") as f:
+                    json.dump(manifest, f)
+
+            replace_atomic(manifest_path, write)
+        self.windows: dict[str, str] = {}
+        self.shard_names: list[str] = []
+        self.read_log()
+        self._buffer: list = []
+        self._buffer_keys: list[str] = []
+        self._buffer_rows = 0
+
+    def read_log(self) -> None:
+        """Load the recorded shards, truncating a torn last line"""
+        log_path = self.dir / LOG
+        if not log_path.exists():
+            return
+        with open(log_path, "rb") as f:
+            data = f.read()
+        end = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("torn line")
+                entry = json.loads(line)
+            except ValueError:
+                break
+            self.shard_names.append(entry["shard"])
+            for key in entry["windows"]:
+                self.windows[key] = entry["shard"]
+            end += len(line)
+        if end < len(data):
+            with open(log_path, "r+b") as f:
+                f.truncate(end)
+
+    def done(self, rio_window: Window) -> bool:
+        return window_key(rio_window) in self.windows
+
+    def save(self, rio_window: Window, cells: Union[np.ndarray, pd.DataFrame]) -> None:
+        """Buffer the cells of a window, or a frame of per-cell values, writing
+        a shard once enough are buffered
+        """
+        self._buffer.append(cells)
+        self._buffer_keys.append(window_key(rio_window))
+        self._buffer_rows += len(cells)
+        if (
+            self._buffer_rows >= self.shard_rows
+            or len(self._buffer_keys) >= self.shard_windows
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered windows as one shard and record them"""
+        if not self._buffer_keys:
+            return
+        if isinstance(self._buffer[0], pd.DataFrame):
+            frame = pd.concat(self._buffer, ignore_index=True)
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+        else:
+            cells = np.concatenate(
+                [np.asarray(c, dtype=np.uint64) for c in self._buffer]
+            )
+            table = pa.table({"h3_index": pa.array(cells, type=pa.uint64())})
+        # shards of a crashed flush that never made it into the log are overwritten
+        shard = f"shard-{len(self.shard_names):06d}.parquet"
+        replace_atomic(self.dir / shard, lambda path: pq.write_table(table, path))
+        line = json.dumps({"shard": shard, "windows": self._buffer_keys}) + "\n"
+        with open(self.dir / LOG, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self.shard_names.append(shard)
+        for key in self._buffer_keys:
+            self.windows[key] = shard
+        self._buffer, self._buffer_keys, self._buffer_rows = [], [], 0
+
+    def shards(self) -> Iterator[Union[np.ndarray, pd.DataFrame]]:
+        """Yield what was saved for the completed windows, one shard at a time"""
+        for shard in self.shard_names:
+            table = pq.read_table(self.dir / shard)
+            if table.column_names == ["h3_index"]:
+                yield table["h3_index"].to_numpy()
+            else:
+                yield table.to_pandas()
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+    def clear(self) -> None:
+        """Remove the spill directory once its cells have been written out"""
+        shutil.rmtree(self.dir, ignore_errors=True)
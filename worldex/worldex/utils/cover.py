@@ -0,0 +1,119 @@
+"""Hierarchical, already compact h3 covers of polygons
+"""
+
+from typing import Literal
+
+import h3
+import numpy as np
+import pyarrow as pa
+import shapely
+from h3ronpy.arrow import change_resolution, grid_disk
+from h3ronpy.arrow.vector import (
+    cells_bounds_arrays,
+    cells_to_coordinates,
+    cells_to_wkb_polygons,
+)
+from shapely import Geometry
+
+from ..handlers.base import METERS_PER_DEGREE
+from .cells import CONTAINMENT_MODES, compact_cells, polyfill_wkb
+
+CONTAINMENTS = tuple(CONTAINMENT_MODES)
+
+# a feature is covered from the coarsest resolution at which it still spans
+# this many cell edges, smaller features are polyfilled directly
+START_EDGES = 4
+
+
+def start_resolution(geom: Geometry, resolution: int) -> int:
+    """Coarsest resolution whose cells are small next to the feature"""
+    minx, miny, maxx, maxy = shapely.bounds(geom)
+    extent = max(maxx - minx, maxy - miny) * METERS_PER_DEGREE
+    for start in range(resolution):
+        if h3.edge_length(start, "m") * START_EDGES <= extent:
+            return start
+    return resolution
+
+
+def polyfill(geoms, resolution: int, containment: str) -> np.ndarray:
+    return (
+        polyfill_wkb(shapely.to_wkb(np.asarray(geoms)), resolution, containment)
+        .unique()
+        .to_numpy(zero_copy_only=False)
+    )
+
+
+def as_uint64(cells) -> np.ndarray:
+    return cells.to_numpy(zero_copy_only=False).astype(np.uint64)
+
+
+def cover_polygon(
+    geom: Geometry, start: int, resolution: int, containment: str
+) -> np.ndarray:
+    """Cells of mixed resolutions covering a single polygon.
+
+    Candidates start from the cells of `start` touching the polygon and their
+    neighbours. Every level, cells whose descendants are certainly all in are
+    kept whole, cells whose descendants are certainly all out are dropped and
+    only the remaining cells along the boundary are split into their
+    children. The children of a cell stick out of it by less than half its
+    width, so both decisions are taken on its bounding box grown by that
+    margin, which prepared predicates test quickly.
+    """
+    shapely.prepare(geom)
+    candidates = grid_disk(
+        pa.array(polyfill([geom], start, "intersects"), type=pa.uint64()),
+        1,
+        flatten=True,
+    ).unique()
+    cover = []
+    for level in range(start, resolution):
+        bounds = cells_bounds_arrays(candidates)
+        minx, miny = bounds["minx"].to_numpy(), bounds["miny"].to_numpy()
+        maxx, maxy = bounds["maxx"].to_numpy(), bounds["maxy"].to_numpy()
+        margin = np.maximum(maxx - minx, maxy - miny) / 2
+        # boxes around the cells, grown by the margin, stand in for their descendants
+        reach = shapely.box(minx - margin, miny - margin, maxx + margin, maxy + margin)
+        inside = shapely.contains_properly(geom, reach)
+        outside = ~shapely.intersects(geom, reach)
+        cells = as_uint64(candidates)
+        cover.append(cells[inside])
+        split = pa.array(cells[~(inside | outside)], type=pa.uint64())
+        candidates = change_resolution(split, level + 1)
+    if containment == "centroid":
+        centroids = cells_to_coordinates(candidates)
+        keep = shapely.intersects_xy(
+            geom, centroids["lng"].to_numpy(), centroids["lat"].to_numpy()
+        )
+    else:
+        polygons = shapely.from_wkb(np.asarray(cells_to_wkb_polygons(candidates)))
+        keep = shapely.intersects(geom, polygons)
+    cover.append(as_uint64(candidates)[keep])
+    return np.concatenate(cover)
+
+
+def hierarchical_cover(
+    geoms, resolution: int, containment: Literal["intersects", "centroid"]
+) -> np.ndarray:
+    """Compact cells as uint64 equal to compacting the cells of `resolution`
+    that intersect the polygons, or hold their centroid in them with
+    `containment="centroid"`, without ever listing those cells.
+
+    Large polygons are covered from a resolution driven by their size down,
+    refining only along their boundary, small ones are polyfilled directly.
+    With "intersects" every cell whose boundary intersects a polygon is
+    kept, h3ronpy's IntersectsBoundary polyfill misses a few of those along
+    long edges.
+    """
+    if containment not in CONTAINMENTS:
+        raise ValueError(
+            f"containment must be one of {CONTAINMENTS}, got {containment!r}"
+        )
+    geoms = np.asarray(geoms)
+    geoms = geoms[~(shapely.is_missing(geoms) | shapely.is_empty(geoms))]
+    starts = np.array([start_resolution(geom, resolution) for geom in geoms], dtype=int)
+    fine = starts >= resolution
+    cells = [polyfill(geoms[fine], resolution, containment)]
+    for geom, start in zip(geoms[~fine], starts[~fine]):
+        cells.append(cover_polygon(geom, start, resolution, containment))
+    return compact_cells(np.concatenate(cells))
@@ -1,9 +1,31 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from .checkpoint import replace_atomic
+
+# bytes read per iteration of a response, large enough that python overhead
+# per chunk disappears next to the network
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# files served with range support are fetched in segments of this size, in
+# parallel and resumable segment by segment
+SEGMENT_SIZE = 8 * 1024 * 1024
+
+# size budget of a `DownloadCache` unless given
+CACHE_MAX_BYTES = 50 * 1024**3
 
 
 def unzip_file(filename, dir):
@@ -12,19 +34,404 @@ def unzip_file(filename, dir):
         zip_ref.extractall(dir)
 
 
-def download_file(url, filename):
-    """Download a large file using python streams"""
-    # TODO: Optional progress bar
-    with requests.get(url, stream=True) as r:
-        r.raise_for_status()
-        # total_size_in_bytes= int(response.headers.get('content-length', 0))
-        # progress_bar = tqdm(total=total_size_in_bytes, unit='iB', unit_scale=True)
-        with open(filename, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    # progress_bar.update(len(data))
+class DownloadError(Exception):
+    """A download ended with a size or ETag other than announced"""
+
+
+class Probe(NamedTuple):
+    """What a server announces for a url before downloading it"""
+
+    url: str
+    length: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    ranges: bool = False
+
+
+def map_downloads(
+    download: Callable[[str, os.PathLike], Path],
+    items: Iterable[Tuple[str, os.PathLike]],
+    workers: int,
+    ignore_errors: bool = False,
+) -> list:
+    """Call `download` on (url, filename) pairs with `workers` threads.
+
+    Returns the filenames in order. With `ignore_errors` a failed download
+    is returned as its exception instead of being raised.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download, url, filename) for url, filename in items]
+        results = []
+        for future in futures:
+            if ignore_errors and future.exception() is not None:
+                results.append(future.exception())
+            else:
+                results.append(future.result())
+        return results
+
+
+class Downloader:
+    """Download files over a shared pool of HTTP connections.
+
+    Files whose server accepts range requests and announces a length are
+    split into `segment_size` segments fetched in parallel into a `.part`
+    file. Completed segments are recorded next to it, so an interrupted
+    download resumes with the missing segments, as long as the ETag of the
+    file did not change in between. Other files are streamed in one piece.
+    A download is only moved in place once its size, and the ETag of every
+    response, match what the server first announced.
+
+    Usage:
+
+    >>> downloader = Downloader(workers=8)
+    >>> downloader.download_many([(url, dir / "file.tif"), ...])
+    >>> downloader.stats
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        segment_workers: int = 4,
+        chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+        segment_size: int = SEGMENT_SIZE,
+        retries: int = 3,
+        timeout: float = 60,
+    ) -> None:
+        self.workers = workers
+        self.segment_workers = segment_workers
+        self.chunk_size = chunk_size
+        self.segment_size = segment_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=workers,
+            pool_maxsize=workers * segment_workers,
+            max_retries=retries,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # files are stored as served, never transparently decompressed
+        self.session.headers["Accept-Encoding"] = "identity"
+        self.retries = retries
+        self._lock = threading.Lock()
+        self.stats = {"files": 0, "skipped": 0, "resumed": 0, "bytes": 0}
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def probe(self, url: str) -> Probe:
+        """Final url, length, validators and range support announced for `url`"""
+        try:
+            r = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        except requests.RequestException:
+            return Probe(url)
+        if not r.ok:
+            return Probe(url)
+        length = r.headers.get("Content-Length")
+        return Probe(
+            r.url,
+            int(length) if length is not None else None,
+            r.headers.get("ETag"),
+            r.headers.get("Last-Modified"),
+            r.headers.get("Accept-Ranges") == "bytes",
+        )
+
+    def download(
+        self, url: str, filename: os.PathLike, probe: Optional[Probe] = None
+    ) -> Path:
+        """Download `url` to `filename`, skipping files already complete"""
+        filename = Path(filename)
+        url, length, etag, _, ranges = probe or self.probe(url)
+        if filename.exists() and length is not None:
+            if filename.stat().st_size == length:
+                self.count("skipped")
+                return filename
+        part = filename.with_name(filename.name + ".part")
+        if ranges and length:
+            self.download_segments(url, part, length, etag)
+        else:
+            self.download_stream(url, part, length, etag)
+        os.replace(part, filename)
+        self.count("files")
+        return filename
+
+    def download_many(
+        self,
+        items: Iterable[Tuple[str, os.PathLike]],
+        ignore_errors: bool = False,
+    ) -> list:
+        """Download (url, filename) pairs concurrently, see `map_downloads`"""
+        return map_downloads(self.download, items, self.workers, ignore_errors)
+
+    def download_stream(
+        self, url: str, part: Path, length: Optional[int], etag: Optional[str]
+    ) -> None:
+        with self.session.get(url, stream=True, timeout=self.timeout) as r:
+            r.raise_for_status()
+            check_etag(r, etag)
+            if length is None and "Content-Length" in r.headers:
+                length = int(r.headers["Content-Length"])
+            with open(part, "wb") as f:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
                     f.write(chunk)
-                    f.flush()
+                    self.count("bytes", len(chunk))
+        size = part.stat().st_size
+        if length is not None and size != length:
+            part.unlink()
+            raise DownloadError(f"{url}: expected {length} bytes, got {size}")
+
+    def download_segments(
+        self, url: str, part: Path, length: int, etag: Optional[str]
+    ) -> None:
+        state_path = part.with_name(part.name + ".json")
+        state = {"url": url, "length": length, "etag": etag, "done": []}
+        if part.exists() and state_path.exists():
+            with open(state_path) as f:
+                saved = json.load(f)
+            if {**saved, "done": []} == state and etag is not None:
+                state = saved
+                self.count("resumed")
+        if not state["done"]:
+            with open(part, "wb") as f:
+                f.truncate(length)
+        done = set(state["done"])
+        starts = [
+            start for start in range(0, length, self.segment_size) if start not in done
+        ]
+
+        def fetch(start: int) -> None:
+            end = min(start + self.segment_size, length) - 1
+            self.download_range(url, part, start, end, etag)
+            with self._lock:
+                state["done"].append(start)
+                replace_atomic(
+                    state_path, lambda path: path.write_text(json.dumps(state))
+                )
+
+        with ThreadPoolExecutor(max_workers=self.segment_workers) as executor:
+            list(executor.map(fetch, starts))
+        if part.stat().st_size != length:
+            raise DownloadError(
+                f"{url}: expected {length} bytes, got {part.stat().st_size}"
+            )
+        state_path.unlink()
+
+    def download_range(
+        self, url: str, part: Path, start: int, end: int, etag: Optional[str]
+    ) -> None:
+        headers = {"Range": f"bytes={start}-{end}"}
+        if etag is not None and not etag.startswith("W/"):
+            # a changed file is answered in full rather than as a range
+            headers["If-Range"] = etag
+        for attempt in range(self.retries + 1):
+            try:
+                with self.session.get(
+                    url, headers=headers, stream=True, timeout=self.timeout
+                ) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise DownloadError(f"{url} changed or ignores ranges")
+                    check_etag(r, etag)
+                    written = 0
+                    with open(part, "r+b") as f:
+                        f.seek(start)
+                        for chunk in r.iter_content(chunk_size=self.chunk_size):
+                            f.write(chunk)
+                            written += len(chunk)
+                    self.count("bytes", written)
+                    if written != end - start + 1:
+                        raise requests.ConnectionError(
+                            f"{url}: segment {start}-{end} cut short at {written} bytes"
+                        )
+                    return
+            except requests.RequestException:
+                if attempt == self.retries:
+                    raise
+
+
+def check_etag(response: requests.Response, etag: Optional[str]) -> None:
+    served = response.headers.get("ETag")
+    if etag is not None and served is not None and served != etag:
+        raise DownloadError(
+            f"{response.url} changed during download: {served} != {etag}"
+        )
+
+
+class DownloadCache:
+    """Content addressed store of downloads shared across datasets and runs.
+
+    Downloads are keyed by their url and ETag, or Last-Modified date, and
+    stored once per content hash under `objects/`. A hit is hardlinked into
+    the requested location, or copied across filesystems, instead of being
+    downloaded again. The least recently used downloads are evicted once the
+    store outgrows `max_bytes`, a file still linked from a dataset directory
+    keeps its space until that copy is removed as well. Urls announcing no
+    validator cannot be told apart from a newer version and bypass the store.
+
+    Linked files share their content with the store and must not be
+    modified in place.
+
+    Usage:
+
+    >>> cache = DownloadCache("~/.cache/worldex", max_bytes=10 * 1024**3)
+    >>> cache.download_many([(url, dir / "file.tif"), ...])
+    >>> cache.stats
+    """
+
+    INDEX = "index.json"
+
+    def __init__(
+        self,
+        dir: os.PathLike,
+        max_bytes: int = CACHE_MAX_BYTES,
+        downloader: Optional[Downloader] = None,
+    ) -> None:
+        self.dir = Path(dir).expanduser()
+        (self.dir / "objects").mkdir(parents=True, exist_ok=True)
+        (self.dir / "tmp").mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self.downloader = downloader or Downloader()
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, Tuple[threading.Lock, int]] = {}
+        index_path = self.dir / self.INDEX
+        self.entries: dict = (
+            json.loads(index_path.read_text()) if index_path.exists() else {}
+        )
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+
+    def blob(self, digest: str) -> Path:
+        return self.dir / "objects" / digest[:2] / digest
+
+    def save(self) -> None:
+        index = json.dumps(self.entries)
+        replace_atomic(self.dir / self.INDEX, lambda path: path.write_text(index))
+
+    def download(self, url: str, filename: os.PathLike) -> Path:
+        """Link the cached download of `url` to `filename`, downloading it first
+        on a miss.
+        """
+        filename = Path(filename)
+        probe = self.downloader.probe(url)
+        validator = probe.etag or probe.last_modified
+        if validator is None:
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return self.downloader.download(url, filename, probe)
+        key = hashlib.sha256(f"{probe.url}\n{validator}".encode()).hexdigest()
+        # a concurrent miss on the same key waits for the first download and
+        # then links the stored copy
+        with self.key_lock(key):
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry is not None and self.blob(entry["sha256"]).exists():
+                    entry["last_used"] = time.time()
+                    self.stats["hits"] += 1
+                    self.save()
+                    link_file(self.blob(entry["sha256"]), filename)
+                    return filename
+                self.stats["misses"] += 1
+            # named after the key, so an interrupted download resumes on the next run
+            tmp = self.downloader.download(url, self.dir / "tmp" / key, probe)
+            digest = file_sha256(tmp)
+            with self._lock:
+                blob = self.blob(digest)
+                if blob.exists():
+                    tmp.unlink()
+                else:
+                    blob.parent.mkdir(exist_ok=True)
+                    os.replace(tmp, blob)
+                self.entries[key] = {
+                    "url": probe.url,
+                    "sha256": digest,
+                    "size": blob.stat().st_size,
+                    "last_used": time.time(),
+                }
+                self.evict(keep=key)
+                self.save()
+                link_file(blob, filename)
+        return filename
+
+    @contextmanager
+    def key_lock(self, key: str) -> Iterator[None]:
+        """Hold the lock of a key, shared by the threads downloading it"""
+        with self._lock:
+            lock, users = self._key_locks.get(key, (threading.Lock(), 0))
+            self._key_locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._key_locks[key]
+                if users == 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (lock, users - 1)
+
+    def download_many(
+        self,
+        items: Iterable[Tuple[str, os.PathLike]],
+        ignore_errors: bool = False,
+    ) -> list:
+        """Download (url, filename) pairs concurrently, see `map_downloads`"""
+        return map_downloads(
+            self.download, items, self.downloader.workers, ignore_errors
+        )
+
+    def size(self) -> int:
+        """Bytes held by the store, content shared by several urls counted once"""
+        return sum({e["sha256"]: e["size"] for e in self.entries.values()}.values())
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Drop the least recently used downloads until the store fits `max_bytes`"""
+        total = self.size()
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self.entries.pop(key)
+            self.stats["evictions"] += 1
+            if all(e["sha256"] != entry["sha256"] for e in self.entries.values()):
+                self.blob(entry["sha256"]).unlink(missing_ok=True)
+                total -= entry["size"]
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_file(source: Path, target: Path) -> None:
+    """Hardlink `source` to `target`, copying when they are on different devices"""
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def download_file(url, filename):
+    """Download a large file, see `Downloader`"""
+    return Downloader(workers=1).download(url, filename)
+
+
+def download_files(
+    items: Iterable[Tuple[str, os.PathLike]],
+    workers: int = 4,
+    cache: Optional[DownloadCache] = None,
+    **kwargs,
+) -> list:
+    """Download (url, filename) pairs concurrently, through `cache` when given,
+    see `Downloader.download_many`
+    """
+    if cache is not None:
+        return cache.download_many(items, **kwargs)
+    return Downloader(workers=workers).download_many(items, **kwargs)
 
 
 @contextmanager